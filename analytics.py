@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+from data_store import SALES_COLUMNS, month_order
+
+# Fields of a comparison between two years, for every (month, metric) cell: the last and
+# first year's values, the change between them, the last year's change from the year
+# before it, and the compound annual growth rate over the range
+CURRENT, PREVIOUS, VARIANCE, PERCENTAGE_CHANGE, YOY, CAGR = range(6)
+
+
+def percentage_change(before, after):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(before != 0, (after - before) / before * 100, np.nan)
+
+
+class ComparisonCube:
+    # Dense year x month x metric array of monthly values for every year from first_year
+    # to last_year (NaN where there is no data), plus every month's year-over-year change.
+    # It is built once per data version with a single group-by; comparing any two years is
+    # then a handful of array operations over every month and metric at once, so the
+    # Monthly Performance tables only index into it.
+    def __init__(self, df, first_year, last_year, metrics=tuple(SALES_COLUMNS)):
+        self.metrics = list(metrics)
+        self.metric_index = {metric: i for i, metric in enumerate(self.metrics)}
+        self.month_index = {month: i for i, month in enumerate(month_order)}
+        self.years = list(range(first_year, last_year + 1))
+
+        # Monthly means for every year, laid out as (year, month, metric)
+        means = df.groupby([df["year"], df["month"].cat.codes])[self.metrics].mean()
+        full_index = pd.MultiIndex.from_product([self.years, range(len(month_order))])
+        self.values = means.reindex(full_index).to_numpy(dtype=float).reshape(
+            len(self.years), len(month_order), len(self.metrics)
+        )
+        # Change from the same month of the year before; NaN for the first year
+        previous = np.concatenate([np.full_like(self.values[:1], np.nan), self.values[:-1]])
+        self.yoy = percentage_change(previous, self.values)
+
+        self.comparisons = {}
+        # Returned for months that are not in the calendar (e.g. a cleared dropdown)
+        self.missing = np.full((len(self.metrics), 6), np.nan)
+
+    def year_values(self, first_year, last_year):
+        # (year, month, metric) values for the years from first_year to last_year
+        return self.values[first_year - self.years[0]:last_year - self.years[0] + 1]
+
+    def year_lookup(self, month_name, metric, first_year, last_year):
+        # One month's value of a metric for each year from first_year to last_year
+        month = self.month_index.get(month_name)
+        values = self.year_values(first_year, last_year)[:, :, self.metric_index[metric]]
+        if month is None:
+            return np.full(len(values), np.nan)
+        return values[:, month]
+
+    def compare(self, first_year, last_year):
+        # (month, metric, field) array comparing last_year with first_year, computed once
+        # per pair of years
+        key = (first_year, last_year)
+        if key not in self.comparisons:
+            first = self.values[first_year - self.years[0]]
+            last = self.values[last_year - self.years[0]]
+            span = last_year - first_year
+            with np.errstate(divide="ignore", invalid="ignore"):
+                growth = np.power(last / first, 1 / span) - 1 if span else np.full_like(last, np.nan)
+            cagr = np.where((first > 0) & (last > 0), growth * 100, np.nan)
+            self.comparisons[key] = np.stack(
+                [last, first, last - first, percentage_change(first, last), self.yoy[last_year - self.years[0]], cagr],
+                axis=-1,
+            )
+        return self.comparisons[key]
+
+    def lookup(self, month_name, metric, first_year, last_year):
+        # (current, previous, variance, percentage change, YoY, CAGR) for one month and
+        # metric, comparing last_year with first_year
+        month = self.month_index.get(month_name)
+        if month is None:
+            return self.missing[self.metric_index[metric]]
+        return self.compare(first_year, last_year)[month, self.metric_index[metric]]
+
+
+def build_comparison_cube(sales):
+    # ComparisonCube over every year in a SalesFrame or SalesDatabase
+    first_year, last_year = sales.year_range()
+    return ComparisonCube(sales.rows_between(first_year, last_year), first_year, last_year)
+
+
+# Periods the KPI graph can resample to, with their x axis titles. Days and weeks are
+# summed from the daily rows, months and quarters from the monthly totals.
+FREQUENCIES = {"day": "Day", "week": "Week", "month": "Month", "quarter": "Quarter"}
+DAILY_FREQUENCIES = ("day", "week")
+
+# Year that periods are drawn in, so the same period of different years overlays on one
+# date axis. A leap year, so that February 29 has a place.
+REFERENCE_YEAR = 2000
+
+# Metrics that are a ratio of two summed metrics rather than a sum themselves
+RATIO_METRICS = {"simulcast_daily_averages": ("simulcast_revenue", "number_of_simulcast_days")}
+
+
+def period_keys(dates, frequency):
+    # Position of each date within its year, so the same period of different years lines
+    # up: month * 100 + day, the week of the year (days 1-7 are week 1), the month or the
+    # quarter. Keys sort in calendar order.
+    if frequency == "day":
+        return dates.month * 100 + dates.day
+    if frequency == "week":
+        return (dates.dayofyear - 1) // 7 + 1
+    if frequency == "month":
+        return dates.month
+    if frequency == "quarter":
+        return (dates.month - 1) // 3 + 1
+    raise ValueError(f"Unknown frequency: {frequency}")
+
+
+def period_dates(keys, frequency):
+    # Dates in REFERENCE_YEAR at which the periods with the given keys are drawn: the day
+    # itself, or the first day of the week, month or quarter
+    keys = np.asarray(keys, dtype=int)
+    if frequency == "week":
+        return pd.DatetimeIndex(np.datetime64(f"{REFERENCE_YEAR}-01-01", "ns") + (keys - 1) * np.timedelta64(7, "D"))
+    if frequency == "day":
+        months, days = keys // 100, keys % 100
+    elif frequency == "month":
+        months, days = keys, np.ones_like(keys)
+    else:
+        months, days = (keys - 1) * 3 + 1, np.ones_like(keys)
+    return pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({"year": REFERENCE_YEAR, "month": months, "day": days})))
+
+
+def lttb(x, y, max_points):
+    # Indices of the points Largest-Triangle-Three-Buckets keeps from (x, y), which must
+    # be sorted by x. The first and last points are always kept. Every other kept point
+    # is the one in its bucket forming the largest triangle with the previously kept point
+    # and the mean of the next bucket, which preserves the peaks and troughs that
+    # averaging would flatten. Bucket means come from one np.add.reduceat; only the
+    # choice of each bucket's point depends on the one before, so only that loops.
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # The n - 2 points between the first and the last, split into max_points - 2 buckets
+    edges = 1 + (np.arange(max_points - 1) * (n - 2)) // (max_points - 2)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # The third vertex for each bucket: the next bucket's mean, or the last point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # Twice the triangle areas; the factor doesn't change which one is largest
+        areas = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_series(series, max_points, visible=None):
+    # Thin a Series indexed by a sorted DatetimeIndex to at most max_points points with
+    # LTTB. With visible=(start, end), only that range is kept, plus the nearest point
+    # beyond each end so the line still runs to the edges of the view. Missing values
+    # are dropped before thinning, since LTTB needs every y.
+    if visible is not None:
+        start = series.index.searchsorted(pd.Timestamp(visible[0]), side="left")
+        stop = series.index.searchsorted(pd.Timestamp(visible[1]), side="right")
+        series = series.iloc[max(start - 1, 0):stop + 1]
+    if len(series) > max_points:
+        series = series.dropna()
+        series = series.iloc[lttb(series.index.asi8, series.to_numpy(), max_points)]
+    return series
+
+
+def resample_metric(frame, metric, frequency, years):
+    # {year: Series of the metric per period key} for each of the given years. frame must
+    # be indexed by a sorted DatetimeIndex, so the years are located with a binary search
+    # and summed with one group-by over (year, period key).
+    columns = list(RATIO_METRICS.get(metric, (metric,)))
+    start, stop = frame.index.searchsorted([pd.Timestamp(min(years), 1, 1), pd.Timestamp(max(years) + 1, 1, 1)])
+    rows = frame[columns].iloc[start:stop]
+    sums = rows.groupby([rows.index.year, period_keys(rows.index, frequency)]).sum()
+    if metric in RATIO_METRICS:
+        numerator, denominator = RATIO_METRICS[metric]
+        values = (sums[numerator] / sums[denominator].where(sums[denominator] != 0)).round(2)
+    else:
+        values = sums[metric]
+
+    empty = pd.Series(dtype=values.dtype, index=pd.Index([], dtype=int))
+    return {year: values.xs(year) if year in values.index.get_level_values(0) else empty for year in years}
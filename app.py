@@ -1,49 +1,72 @@
-from dash import Dash, html, dcc, Input, Output, dash_table
-import plotly.graph_objs as go
+import functools
+import json
+import os
+import pkgutil
+
+from dash import Dash, html, dcc, Input, Output, ClientsideFunction, Patch, ctx, dash_table
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import numpy as np
 
-# Load the CSV data into a DataFrame
-df = pd.read_csv("data/csvs/sales.csv")
-
-# Convert 'date' column to datetime to extract year and month
-df["date"] = pd.to_datetime(df["date"])
-df["year"] = df["date"].dt.year
-df["month_name"] = df["date"].dt.strftime("%B")
-
-# Define the calendar order for months
-month_order = [
-    "January",
-    "February",
-    "March",
-    "April",
-    "May",
-    "June",
-    "July",
-    "August",
-    "September",
-    "October",
-    "November",
-    "December",
-]
-df["month"] = pd.Categorical(df["month_name"], categories=month_order, ordered=True)
+from analytics import (
+    DAILY_FREQUENCIES,
+    FREQUENCIES,
+    build_comparison_cube,
+    downsample_series,
+    period_dates,
+    resample_metric,
+)
+from callback_cache import CallbackCache
+from data_store import DATA_DIR, STORAGE_ENGINE, SnapshotManager, TargetsIndex, month_order
+from instrumentation import CallbackMetrics, CallbackProfiler
+
+# Render the month tables, gauges and KPI graph in the browser from data embedded in the
+# page, instead of making a server round-trip for every dropdown change
+CLIENTSIDE_RENDERING = os.environ.get("CLIENTSIDE_RENDERING", "0") == "1"
+
+# Most points sent per KPI graph trace. Longer series are thinned with LTTB, and zooming in
+# re-queries the visible range at up to the same number of points.
+KPI_GRAPH_MAX_POINTS = int(os.environ.get("KPI_GRAPH_MAX_POINTS", "1000"))
+
+# Load the sales data (columnar store, or sales.csv as a fallback). New data versions are
+# picked up in the background, so callbacks must read the data through a snapshot.
+data_snapshots = SnapshotManager()
+
+# Monthly targets, loaded once and reloaded whenever a targets CSV changes
+sales_targets = TargetsIndex()
+
+# Per-callback latency, payload size and cache hit/miss metrics, served at /metrics
+callback_metrics = CallbackMetrics()
+
+# Callback results shared by all workers, keyed on the inputs, the data version and the
+# settings that change the outputs
+callback_cache = CallbackCache(
+    on_lookup=callback_metrics.record_cache_lookup,
+    settings={"data_dir": DATA_DIR, "storage_engine": STORAGE_ENGINE, "kpi_graph_max_points": KPI_GRAPH_MAX_POINTS},
+)
+
+
+def sales_data_version():
+    return data_snapshots.current().version
+
+
+def month_outputs_version():
+    return (
+        data_snapshots.current().version,
+        sales_targets.version("live-targets"),
+        sales_targets.version("simulcast-targets"),
+    )
+
 
 excess_step_color = "#6ee7b7"
+live_racing_gauge_colors = {"bar": "#00a2ff", "step": "#e5f6fd"}
+simulcast_gauge_colors = {"bar": "#fa8231", "step": "#ffe5d8"}
 
 
 # Prepare Data Functions
 def get_sales_target(target_file, month_name, year):
-    df_targets = pd.read_csv("data/csvs/" + target_file + ".csv")
-    # Ensure the 'Month' column is in datetime format
-    df_targets["Month"] = pd.to_datetime(df_targets["Month"])
     # Find the target for the given month and year
-    target_row = df_targets[
-        (df_targets["Month"].dt.strftime("%B") == month_name)
-        & (df_targets["Month"].dt.year == year)
-    ]
-    if not target_row.empty:
-        return target_row["Target"].values[0]
-    return 0
+    return sales_targets.get(target_file, year, month_name)
 
 
 def format_percentage_change(value):
@@ -79,98 +102,65 @@ def format_value(metric_name, value):
         return f"{int(value)}"  # Use int() to convert float to int and remove decimals
 
 
-def get_live_races_data(selected_month):
-    current_year = df["year"].max()
-    previous_year = current_year - 1
+live_races_metrics = {
+    "Revenue": "live_racing_revenue",
+    "Purse Structure": "purse_structure",
+    "No. of Races": "number_of_live_races",
+}
 
-    metrics = {
-        "Revenue": "live_racing_revenue",
-        "Purse Structure": "purse_structure",
-        "No. of Races": "number_of_live_races",
-    }
+simulcast_metrics = {
+    "Revenue": "simulcast_revenue",
+    "Daily Averages": "simulcast_daily_averages",
+    "No. of Days": "number_of_simulcast_days",
+}
 
-    data_frames = []
 
-    for metric_name, column_name in metrics.items():
-        current_data = df[
-            (df["month_name"] == selected_month) & (df["year"] == current_year)
-        ][column_name].mean()
-        previous_data = df[
-            (df["month_name"] == selected_month) & (df["year"] == previous_year)
-        ][column_name].mean()
-
-        variance = current_data - previous_data
-        percentage_change = (
-            ((variance / previous_data) * 100) if previous_data else np.nan
-        )
-        formatted_percentage_change = format_percentage_change(percentage_change)
+def get_year_range(year_range, snapshot):
+    # The (first, last) years to compare: the year selector's value limited to the years
+    # with data, or by default the latest year and the one before
+    first_year, last_year = snapshot.sales.year_range()
+    if not year_range:
+        return max(first_year, last_year - 1), last_year
+    start, end = sorted(min(max(int(year), first_year), last_year) for year in year_range)
+    return start, end
 
-        # Format data based on metric type
-        current_data_formatted = format_value(metric_name, current_data)
-        previous_data_formatted = format_value(metric_name, previous_data)
-        variance_formatted = format_value(metric_name, variance)
 
-        data_frames.append(
-            pd.DataFrame(
-                {
-                    "Metric": [metric_name],
-                    str(previous_year): [previous_data_formatted],
-                    str(current_year): [current_data_formatted],
-                    "Variance": [variance_formatted],
-                    "Percentage Change": [formatted_percentage_change],
-                }
-            )
-        )
-
-    combined_data = pd.concat(data_frames, ignore_index=True)
-    return combined_data
-
-
-def get_simulcast_data(selected_month):
-    current_year = df["year"].max()
-    previous_year = current_year - 1
-
-    metrics = {
-        "Revenue": "simulcast_revenue",
-        "Daily Averages": "simulcast_daily_averages",
-        "No. of Days": "number_of_simulcast_days",
-    }
+def get_comparison_data(selected_month, metrics, snapshot, years):
+    # Values for every year in the range, plus the comparison of its last and first year.
+    # Every month and metric comes from one cube, computed once per data version.
+    comparison_cube = snapshot.derive("comparison_cube", build_comparison_cube)
+    first_year, last_year = years
 
-    data_frames = []
+    records = []
 
     for metric_name, column_name in metrics.items():
-        current_data = df[
-            (df["month_name"] == selected_month) & (df["year"] == current_year)
-        ][column_name].mean()
-        previous_data = df[
-            (df["month_name"] == selected_month) & (df["year"] == previous_year)
-        ][column_name].mean()
-
-        variance = current_data - previous_data
-        percentage_change = (
-            ((variance / previous_data) * 100) if previous_data else np.nan
+        year_values = comparison_cube.year_lookup(selected_month, column_name, first_year, last_year)
+        _, _, variance, percentage_change, yoy, cagr = comparison_cube.lookup(
+            selected_month, column_name, first_year, last_year
         )
-        formatted_percentage_change = format_percentage_change(percentage_change)
 
         # Format data based on metric type
-        current_data_formatted = format_value(metric_name, current_data)
-        previous_data_formatted = format_value(metric_name, previous_data)
-        variance_formatted = format_value(metric_name, variance)
+        record = {"Metric": metric_name}
+        for year, value in zip(range(first_year, last_year + 1), year_values):
+            record[str(year)] = format_value(metric_name, value)
+        record["Variance"] = format_value(metric_name, variance)
+        record["Percentage Change"] = format_percentage_change(percentage_change)
+        if last_year - first_year > 1:
+            record["YoY"] = format_percentage_change(yoy)
+            record["CAGR"] = format_percentage_change(cagr)
+        records.append(record)
 
-        data_frames.append(
-            pd.DataFrame(
-                {
-                    "Metric": [metric_name],
-                    str(previous_year): [previous_data_formatted],
-                    str(current_year): [current_data_formatted],
-                    "Variance": [variance_formatted],
-                    "Percentage Change": [formatted_percentage_change],
-                }
-            )
-        )
+    return pd.DataFrame(records)
+
+
+def get_live_races_data(selected_month, years, snapshot=None):
+    snapshot = snapshot or data_snapshots.current()
+    return get_comparison_data(selected_month, live_races_metrics, snapshot, years)
 
-    combined_data = pd.concat(data_frames, ignore_index=True)
-    return combined_data
+
+def get_simulcast_data(selected_month, years, snapshot=None):
+    snapshot = snapshot or data_snapshots.current()
+    return get_comparison_data(selected_month, simulcast_metrics, snapshot, years)
 
 
 # Initialize Dash app
@@ -182,414 +172,712 @@ app = Dash(
 )
 app.title = "SVREL Sales Analysis Dashboard"
 server = app.server
+callback_metrics.init_app(app)
+CallbackProfiler().init_app(app)
 
-# Dash App Layout
-app.layout = html.Div(
-    style={
-        "display": "flex",
-        "flexDirection": "column",
-        "minHeight": "100vh",
-        "font-size": "1.35em",
-        # "backgroundColor": "#f8fafc",
-    },  # Main container with flex display
-    children=[
-        # Full-width Header Bar with Logo
-        html.Div(
-            className="bg-white w-full p-4 flex justify-between items-center shadow-md",  # Adjust the background color and padding as needed
-            children=[
-                html.Img(
-                    src=app.get_asset_url("img/logo.png"), style={"height": "50px"}
-                ),  # Adjust the height as needed
-                html.H1("Caymanas Park", className="text-white text-xl"),
-            ],
-        ),
-        # Container for the rest of the content
-        html.Div(
-            className="flex-grow container mx-auto px-4",
-            children=[
-                html.H1(
-                    "Sales Analysis Dashboard", className="text-4xl font-bold my-8"
-                ),
-                html.H2(
-                    "Monthly Performance Comparison",
-                    className="text-2xl font-semibold mb-4",
-                ),
-                # Month Selection Dropdown
-                html.Div(
-                    className="mb-4",
-                    children=[
-                        html.Label(
-                            "Select Month:",
-                            className="block text-lg font-medium text-gray-700",
-                        ),
-                        dcc.Dropdown(
-                            id="month-dropdown",
-                            options=[
-                                {"label": month, "value": month}
-                                for month in month_order
-                            ],
-                            value=month_order[0],  # Default to January
-                            className="block w-full mt-1 rounded-md border-gray-300 shadow-sm",
-                        ),
-                    ],
-                ),
-                # Live Races Comparison Table
-                html.Div(
-                    className="mb-8",
-                    children=[
-                        html.Label(
-                            "Live Racing:",
-                            className="block text-lg font-medium text-gray-700",
-                        ),
-                        html.Div(id="live-races-comparison-table"),
-                    ],
-                ),
-                # Simulcast Comparison Table
-                html.Div(
-                    className="mb-8",
-                    children=[
-                        html.Label(
-                            "Simulcast:",
-                            className="block text-lg font-medium text-gray-700",
-                        ),
-                        html.Div(id="simulcast-comparison-table"),
-                    ],
-                ),
-                html.H2(
-                    "Monthly Targets",
-                    className="text-2xl font-semibold mb-4 mt-10 text-center",
-                ),
-                html.Div(
-                    className="flex justify-center items-center mt-4",
-                    children=[
-                        dcc.Graph(id="live-race-sales-gauge", className="mr-4"),
-                        dcc.Graph(id="simulcast-sales-gauge", className="ml-4"),
-                    ],
-                ),
-                html.H2("KPI Review", className="text-2xl font-semibold mb-4 mt-10"),
-                html.Div(
-                    className="mb-4",
-                    children=[
-                        html.Label(
-                            "Select an Option:",
-                            className="block text-lg font-medium text-gray-700",
-                        ),
-                        dcc.Dropdown(
-                            id="metric-dropdown",
-                            options=[
-                                {
-                                    "label": "Live Racing Revenue",
-                                    "value": "live_racing_revenue",
-                                },
-                                {
-                                    "label": "Purse Structure",
-                                    "value": "purse_structure",
-                                },
-                                {
-                                    "label": "No. of Live Races",
-                                    "value": "number_of_live_races",
-                                },
-                                {
-                                    "label": "Simulcast Revenue",
-                                    "value": "simulcast_revenue",
-                                },
-                                {
-                                    "label": "Simulcast Daily Averages",
-                                    "value": "simulcast_daily_averages",
-                                },
-                                {
-                                    "label": "No. of Simulcast Days",
-                                    "value": "number_of_simulcast_days",
-                                },
-                            ],
-                            value="live_racing_revenue",  # Default metric
-                            className="block w-full mt-1 rounded-md border-gray-300 shadow-sm",
-                        ),
-                    ],
-                ),
-                dcc.Graph(id="monthly-metric-comparison-graph", className="mt-4"),
-            ],
-        ),
-        html.Div(
-            className="bg-gray-800 text-white py-4 px-8 flex justify-center items-center",
-            children=[html.H1("Developed by Devmassive LLC", className="text-sm")],
-            style={"width": "100%"},
-        ),
-    ],
-)
+# Dropdown values a page opens with
+default_month = month_order[0]
+default_metric = "live_racing_revenue"
+default_frequency = "month"
 
 
-# Callback to Live Races
-@app.callback(
-    Output("live-races-comparison-table", "children"),
-    [Input("month-dropdown", "value")],
-)
-def display_live_races_table(selected_month):
-    live_races_data = get_live_races_data(selected_month)
-    return dash_table.DataTable(
-        data=live_races_data.to_dict("records"),
-        columns=[
-            {"name": "Metric", "id": "Metric"},
-            {
-                "name": str(df["year"].min()),
-                "id": str(df["year"].min()),
-            },  # Previous year column
-            {
-                "name": str(df["year"].max()),
-                "id": str(df["year"].max()),
-            },  # Current year column
-            {"name": "Variance", "id": "Variance"},
-            {"name": "Percentage Change", "id": "Percentage Change"},
-        ],
-        style_table={"overflowX": "auto"},
-        style_header={"fontWeight": "bold", "textAlign": "right", "background-color": "#bae6fd"},
-        style_header_conditional=[
-            {
-                "if": {"column_id": "Metric"},
-                "textAlign": "left",  # Specifically align the "Metric" header to the left
-            }
+# Dash App Layout
+def serve_layout():
+    # Built per page load, so the embedded outputs and clientside data always match the
+    # current data version. The callbacks don't fire on load (prevent_initial_call), so the
+    # page is complete in one request; the gauges rendered here are also the base that the
+    # month callback's patches apply to. Everything comes from one snapshot, so the year
+    # selector always matches the embedded outputs even if new data is loaded meanwhile.
+    snapshot = data_snapshots.current()
+    live_table, simulcast_table, live_gauge, simulcast_gauge, graph = get_initial_outputs(snapshot)
+    first_year, last_year = snapshot.sales.year_range()
+    layout = html.Div(
+        style={
+            "display": "flex",
+            "flexDirection": "column",
+            "minHeight": "100vh",
+            "font-size": "1.35em",
+            # "backgroundColor": "#f8fafc",
+        },  # Main container with flex display
+        children=[
+            # Full-width Header Bar with Logo
+            html.Div(
+                className="bg-white w-full p-4 flex justify-between items-center shadow-md",  # Adjust the background color and padding as needed
+                children=[
+                    html.Img(
+                        src=app.get_asset_url("img/logo.png"), style={"height": "50px"}
+                    ),  # Adjust the height as needed
+                    html.H1("Caymanas Park", className="text-white text-xl"),
+                ],
+            ),
+            # Container for the rest of the content
+            html.Div(
+                className="flex-grow container mx-auto px-4",
+                children=[
+                    html.H1(
+                        "Sales Analysis Dashboard", className="text-4xl font-bold my-8"
+                    ),
+                    html.H2(
+                        "Monthly Performance Comparison",
+                        className="text-2xl font-semibold mb-4",
+                    ),
+                    # Year Range Selection, shared by the tables, gauges and KPI graph
+                    html.Div(
+                        className="mb-4",
+                        children=[
+                            html.Label(
+                                "Select Years:",
+                                className="block text-lg font-medium text-gray-700",
+                            ),
+                            dcc.RangeSlider(
+                                id="year-range-slider",
+                                min=first_year,
+                                max=last_year,
+                                step=1,
+                                marks={year: str(year) for year in range(first_year, last_year + 1)},
+                                value=list(get_year_range(None, snapshot)),
+                                # Keep at least two years selected whenever there are two
+                                pushable=1 if last_year > first_year else 0,
+                            ),
+                        ],
+                    ),
+                    # Month Selection Dropdown
+                    html.Div(
+                        className="mb-4",
+                        children=[
+                            html.Label(
+                                "Select Month:",
+                                className="block text-lg font-medium text-gray-700",
+                            ),
+                            dcc.Dropdown(
+                                id="month-dropdown",
+                                options=[
+                                    {"label": month, "value": month}
+                                    for month in month_order
+                                ],
+                                value=default_month,
+                                className="block w-full mt-1 rounded-md border-gray-300 shadow-sm",
+                            ),
+                        ],
+                    ),
+                    # Live Races Comparison Table
+                    html.Div(
+                        className="mb-8",
+                        children=[
+                            html.Label(
+                                "Live Racing:",
+                                className="block text-lg font-medium text-gray-700",
+                            ),
+                            html.Div(id="live-races-comparison-table", children=live_table),
+                        ],
+                    ),
+                    # Simulcast Comparison Table
+                    html.Div(
+                        className="mb-8",
+                        children=[
+                            html.Label(
+                                "Simulcast:",
+                                className="block text-lg font-medium text-gray-700",
+                            ),
+                            html.Div(id="simulcast-comparison-table", children=simulcast_table),
+                        ],
+                    ),
+                    html.H2(
+                        "Monthly Targets",
+                        className="text-2xl font-semibold mb-4 mt-10 text-center",
+                    ),
+                    html.Div(
+                        className="flex justify-center items-center mt-4",
+                        children=[
+                            dcc.Graph(id="live-race-sales-gauge", figure=live_gauge, className="mr-4"),
+                            dcc.Graph(id="simulcast-sales-gauge", figure=simulcast_gauge, className="ml-4"),
+                        ],
+                    ),
+                    html.H2("KPI Review", className="text-2xl font-semibold mb-4 mt-10"),
+                    html.Div(
+                        className="mb-4",
+                        children=[
+                            html.Label(
+                                "Select an Option:",
+                                className="block text-lg font-medium text-gray-700",
+                            ),
+                            dcc.Dropdown(
+                                id="metric-dropdown",
+                                options=[
+                                    {
+                                        "label": "Live Racing Revenue",
+                                        "value": "live_racing_revenue",
+                                    },
+                                    {
+                                        "label": "Purse Structure",
+                                        "value": "purse_structure",
+                                    },
+                                    {
+                                        "label": "No. of Live Races",
+                                        "value": "number_of_live_races",
+                                    },
+                                    {
+                                        "label": "Simulcast Revenue",
+                                        "value": "simulcast_revenue",
+                                    },
+                                    {
+                                        "label": "Simulcast Daily Averages",
+                                        "value": "simulcast_daily_averages",
+                                    },
+                                    {
+                                        "label": "No. of Simulcast Days",
+                                        "value": "number_of_simulcast_days",
+                                    },
+                                ],
+                                value=default_metric,
+                                className="block w-full mt-1 rounded-md border-gray-300 shadow-sm",
+                            ),
+                        ],
+                    ),
+                    html.Div(
+                        className="mb-4",
+                        children=[
+                            html.Label(
+                                "Group By:",
+                                className="block text-lg font-medium text-gray-700",
+                            ),
+                            dcc.Dropdown(
+                                id="frequency-dropdown",
+                                options=[{"label": label, "value": value} for value, label in FREQUENCIES.items()],
+                                value=default_frequency,
+                                clearable=False,
+                                className="block w-full mt-1 rounded-md border-gray-300 shadow-sm",
+                            ),
+                        ],
+                    ),
+                    dcc.Graph(id="monthly-metric-comparison-graph", figure=graph, className="mt-4"),
+                ],
+            ),
+            html.Div(
+                className="bg-gray-800 text-white py-4 px-8 flex justify-center items-center",
+                children=[html.H1("Developed by Devmassive LLC", className="text-sm")],
+                style={"width": "100%"},
+            ),
         ],
-        style_data_conditional=[
-            {
-                "if": {"column_id": "Metric"},
-                "textAlign": "left",
-                "fontWeight": "bold",
-            },
+    )
+    if CLIENTSIDE_RENDERING:
+        layout.children.append(dcc.Store(id="dashboard-data", data=get_clientside_data(snapshot)))
+    else:
+        # The KPI graph's zoomed x range, set in the browser only when the range changes
+        layout.children.append(dcc.Store(id="kpi-graph-view"))
+    return layout
+
+
+# Outputs for the default dropdown values, computed once per data and targets version
+def get_initial_outputs(snapshot):
+    key = (
+        "initial_outputs",
+        sales_targets.version("live-targets"),
+        sales_targets.version("simulcast-targets"),
+    )
+    years = get_year_range(None, snapshot)
+    return snapshot.derive(
+        key,
+        lambda sales: build_month_outputs(default_month, years, snapshot)
+        + (build_comparison_graph(default_metric, default_frequency, years, snapshot),),
+    )
+
+
+# Callback for everything driven by the month dropdown and year range: both comparison
+# tables and both gauges are returned from one request, sharing the month slice and the
+# targets lookup. The gauges are sent as patches of the numbers and titles that depend on
+# the month and year.
+@callback_cache.memoize("update_month_outputs", month_outputs_version)
+def update_month_outputs(selected_month, year_range=None):
+    snapshot = data_snapshots.current()
+    years = get_year_range(year_range, snapshot)
+    live_table, simulcast_table, live_gauge, simulcast_gauge = build_month_outputs(selected_month, years, snapshot)
+    return (
+        live_table,
+        simulcast_table,
+        figure_patch(live_gauge, revenue_gauge_patch_paths),
+        figure_patch(simulcast_gauge, revenue_gauge_patch_paths),
+    )
+
+
+def build_month_outputs(selected_month, years, snapshot=None):
+    # The gauges show the last year of the range
+    snapshot = snapshot or data_snapshots.current()
+    selected_year = years[1]
+    month_data = snapshot.sales.rows(selected_year, selected_month)
+    live_target = get_sales_target("live-targets", selected_month, selected_year)
+    simulcast_target = get_sales_target("simulcast-targets", selected_month, selected_year)
+
+    return (
+        display_live_races_table(selected_month, years, snapshot),
+        display_simulcast_table(selected_month, years, snapshot),
+        update_live_racing_revenue_gauge(selected_month, selected_year, month_data, live_target),
+        update_simulcast_revenue_gauge(selected_month, selected_year, month_data, simulcast_target),
+    )
+
+
+def get_table_columns(years):
+    first_year, last_year = years
+    columns = [{"name": "Metric", "id": "Metric"}]
+    # One column per year, oldest first
+    columns += [{"name": str(year), "id": str(year)} for year in range(first_year, last_year + 1)]
+    columns += [
+        {"name": "Variance", "id": "Variance"},
+        {"name": "Percentage Change", "id": "Percentage Change"},
+    ]
+    # With more than two years, the last year's change and the growth rate over the range
+    if last_year - first_year > 1:
+        columns += [{"name": "YoY", "id": "YoY"}, {"name": "CAGR", "id": "CAGR"}]
+    return columns
+
+
+# Table columns holding a formatted percentage change ("Up 2.00%", "Down 1.50%")
+change_columns = ("Percentage Change", "YoY", "CAGR")
+
+
+# DataTable styling, shared by the server callbacks and the clientside rendering mode
+live_races_table_style = {
+    "style_table": {"overflowX": "auto"},
+    "style_header": {"fontWeight": "bold", "textAlign": "right", "background-color": "#bae6fd"},
+    "style_header_conditional": [
+        {
+            "if": {"column_id": "Metric"},
+            "textAlign": "left",  # Specifically align the "Metric" header to the left
+        }
+    ],
+    "style_data_conditional": [
+        {
+            "if": {"column_id": "Metric"},
+            "textAlign": "left",
+            "fontWeight": "bold",
+        },
+        *(
             {
                 "if": {
-                    "filter_query": '{Percentage Change} contains "Up"',
-                    "column_id": "Percentage Change",
+                    "filter_query": f'{{{column}}} contains "{direction}"',
+                    "column_id": column,
                 },
+                "color": color,
+                "fontWeight": "bold",
+                "textAlign": "right",
+            }
+            for column in change_columns
+            for direction, color in (("Up", "green"), ("Down", "red"))
+        ),
+    ],
+}
+
+simulcast_table_style = {
+    "style_table": {"overflowX": "auto"},
+    "style_header": {"fontWeight": "bold", "textAlign": "right", "background-color": "#fed7aa"},
+    "style_header_conditional": [
+        {
+            "if": {"column_id": "Metric"},
+            "textAlign": "left",  # Specifically align the "Metric" header to the left
+        }
+    ],
+    "style_data_conditional": [
+        {
+            "if": {"column_id": "Metric"},
+            "textAlign": "left",
+            "fontWeight": "bold",
+        },
+        *(
+            {
+                "if": {"column_id": column},
                 "color": "green",
                 "fontWeight": "bold",
                 "textAlign": "right",
-            },
+            }
+            for column in change_columns
+        ),
+        *(
             {
                 "if": {
-                    "filter_query": '{Percentage Change} contains "Down"',
-                    "column_id": "Percentage Change",
+                    "filter_query": f'{{{column}}} contains "Down"',
+                    "column_id": column,
                 },
                 "color": "red",
                 "fontWeight": "bold",
                 "textAlign": "right",
-            },
-        ],
+            }
+            for column in change_columns
+        ),
+    ],
+}
+
+
+# Live Races table
+def display_live_races_table(selected_month, years, snapshot):
+    live_races_data = get_live_races_data(selected_month, years, snapshot)
+    return dash_table.DataTable(
+        data=live_races_data.to_dict("records"),
+        columns=get_table_columns(years),
+        **live_races_table_style,
     )
 
 
-# Callback to Simulcast
-@app.callback(
-    Output("simulcast-comparison-table", "children"), Input("month-dropdown", "value")
-)
-def display_simulcast_table(selected_month):
-    simulcast_data = get_simulcast_data(selected_month)
+# Simulcast table
+def display_simulcast_table(selected_month, years, snapshot):
+    simulcast_data = get_simulcast_data(selected_month, years, snapshot)
     return [
         dash_table.DataTable(
             data=simulcast_data.to_dict("records"),
-            columns=[
-                {"name": "Metric", "id": "Metric"},
-                {
-                    "name": str(df["year"].min()),
-                    "id": str(df["year"].min()),
-                },  # Previous year column
-                {
-                    "name": str(df["year"].max()),
-                    "id": str(df["year"].max()),
-                },  # Current year column
-                {"name": "Variance", "id": "Variance"},
-                {"name": "Percentage Change", "id": "Percentage Change"},
-            ],
-            style_table={"overflowX": "auto"},
-            style_header={"fontWeight": "bold", "textAlign": "right", "background-color": "#fed7aa"},
-            style_header_conditional=[
-                {
-                    "if": {"column_id": "Metric"},
-                    "textAlign": "left",  # Specifically align the "Metric" header to the left
-                }
-            ],
-            style_data_conditional=[
-                {
-                    "if": {"column_id": "Metric"},
-                    "textAlign": "left",
-                    "fontWeight": "bold",
-                },
-                {
-                    "if": {"column_id": "Percentage Change"},
-                    "color": "green",
-                    "fontWeight": "bold",
-                    "textAlign": "right",
-                },
-                {
-                    "if": {
-                        "filter_query": '{Percentage Change} contains "Down"',
-                        "column_id": "Percentage Change",
-                    },
-                    "color": "red",
-                    "fontWeight": "bold",
-                    "textAlign": "right",
-                },
-            ],
+            columns=get_table_columns(years),
+            **simulcast_table_style,
         )
     ]
 
 
-# Callback to update the graph based on selected metric
-@app.callback(
-    Output("monthly-metric-comparison-graph", "figure"),
-    [Input("metric-dropdown", "value")],
-)
-def update_graph(selected_metric):
-    current_year = df["year"].max()
-    previous_year = current_year - 1
-
-    current_month_data = df[(df["year"] == current_year)][
-        ["month_name", selected_metric]
-    ]
-    previous_year_data = df[(df["year"] == previous_year)][
-        ["month_name", selected_metric]
-    ]
-
-    # Create traces for current year and previous year
-    trace1 = go.Scatter(
-        x=current_month_data["month_name"],
-        y=current_month_data[selected_metric],
-        mode="lines+markers",
-        name=f"Current Year ({current_year})",
-        marker_color="blue",
-        line=dict(dash="solid"),
-    )
+# The graph for the selected metric, frequency and year range. Sent whole: it has no
+# template or other static bulk, so a patch of its traces and titles would be larger than
+# the figure. visible is the zoomed-in (start, end) date range, if any. Cached under the
+# name of the update_graph callback, so its cache metrics share that callback's label.
+@callback_cache.memoize("update_graph", sales_data_version)
+def render_graph(selected_metric, frequency=default_frequency, year_range=None, visible=None):
+    snapshot = data_snapshots.current()
+    years = get_year_range(year_range, snapshot)
+    return build_comparison_graph(selected_metric, frequency, years, snapshot, visible=visible)
+
+
+# Callback to update the graph based on selected metric, frequency, year range and zoom
+def update_graph(selected_metric, frequency, year_range, graph_view):
+    # Dropdown and year range changes draw the whole year. Zooming or panning re-queries
+    # just the visible range, so it is drawn at up to KPI_GRAPH_MAX_POINTS points, and
+    # autoscaling goes back to the whole year. graph_view comes from the "kpi-graph-view"
+    # store, which dashboard.js only sets for x range changes, so autosizing on page load
+    # and window resizes make no request. Nothing is sent when the browser already has
+    # every point.
+    if ctx.triggered_id != "kpi-graph-view":
+        return render_graph(selected_metric, frequency, year_range)
+
+    snapshot = data_snapshots.current()
+    series = get_kpi_series(selected_metric, frequency, get_year_range(year_range, snapshot), snapshot)
+    if all(len(values) <= KPI_GRAPH_MAX_POINTS for values in series.values()):
+        raise PreventUpdate
+    return render_graph(selected_metric, frequency, year_range, (graph_view or {}).get("range"))
+
+
+def get_kpi_series(selected_metric, frequency, years, snapshot):
+    # The metric resampled to `frequency` for each year from years[0] to years[1], indexed
+    # by the periods' dates in analytics.REFERENCE_YEAR; cached on the snapshot per
+    # (metric, frequency, range). Every year comes from one group-by.
+    first_year, last_year = years
+
+    def build(sales):
+        if frequency in DAILY_FREQUENCIES:
+            frame = snapshot.daily_rows(first_year, last_year)
+        else:
+            frame = sales.rows_between(first_year, last_year).set_index("date").sort_index()
+        resampled = resample_metric(frame, selected_metric, frequency, range(first_year, last_year + 1))
+        return {
+            year: pd.Series(values.to_numpy(), index=period_dates(values.index, frequency))
+            for year, values in resampled.items()
+        }
+
+    return snapshot.derive(("kpi_series", selected_metric, frequency, years), build)
+
+
+# x axis formats for each frequency. Every year is drawn on the same date axis, with its
+# periods at their dates in analytics.REFERENCE_YEAR.
+kpi_axis_formats = {
+    "day": {"tickformat": "%b %d", "hoverformat": "%b %d"},
+    "week": {"tickformat": "%b %d", "hoverformat": "Week of %b %d"},
+    "month": {"tickformat": "%B", "dtick": "M1", "hoverformat": "%B"},
+    "quarter": {"tickformat": "Q%q", "dtick": "M3", "hoverformat": "Q%q"},
+}
+
+
+# Colours of the years before the previous one, newest first, reused past the last
+older_year_colors = ["#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf", "#bcbd22"]
+
+
+def year_trace_styles(first_year, last_year):
+    # (year, name, color, dash) of every year's trace, newest first
+    styles = [(last_year, f"Current Year ({last_year})", "blue", "solid")]
+    if last_year > first_year:
+        styles.append((last_year - 1, f"Previous Year ({last_year - 1})", "#aaaaaa", "dot"))
+    for i, year in enumerate(range(last_year - 2, first_year - 1, -1)):
+        styles.append((year, str(year), older_year_colors[i % len(older_year_colors)], "dot"))
+    return styles
+
+
+def comparison_graph_title(selected_metric, first_year, last_year):
+    title = selected_metric.replace("_", " ").title()
+    if first_year == last_year:
+        return title, f"{title} in {last_year}"
+    if last_year - first_year == 1:
+        return title, f"Comparison of {title} between {last_year} and {first_year}"
+    return title, f"Comparison of {title} from {first_year} to {last_year}"
+
+
+def build_comparison_graph(selected_metric, frequency=default_frequency, years=None, snapshot=None, visible=None):
+    snapshot = snapshot or data_snapshots.current()
+    first_year, last_year = years or get_year_range(None, snapshot)
+    series = get_kpi_series(selected_metric, frequency, (first_year, last_year), snapshot)
+
+    xaxis = {"title": {"text": FREQUENCIES[frequency]}, "type": "date", **kpi_axis_formats[frequency]}
+    if visible is not None:
+        xaxis["range"] = list(visible)
+
+    # Figures are built as plain dicts, in the form plotly's JSON encoder would produce
+    # for the equivalent go.Scatter/go.Layout, which skips plotly's property validation
+    title, graph_title = comparison_graph_title(selected_metric, first_year, last_year)
+    return {
+        "data": [
+            comparison_trace(series[year], visible, name, color, dash)
+            for year, name, color, dash in year_trace_styles(first_year, last_year)
+        ],
+        "layout": {
+            "title": {"text": graph_title},
+            "xaxis": xaxis,
+            "yaxis": {"title": {"text": title}},
+        },
+    }
 
-    trace2 = go.Scatter(
-        x=previous_year_data["month_name"],
-        y=previous_year_data[selected_metric],
-        mode="lines+markers",
-        name=f"Previous Year ({previous_year})",
-        marker_color="#aaaaaa",
-        line=dict(dash="dot"),
-    )
 
+def comparison_trace(values, visible, name, color, dash):
+    # Long series are thinned to KPI_GRAPH_MAX_POINTS before they are serialised
+    values = downsample_series(values, KPI_GRAPH_MAX_POINTS, visible)
     return {
-        "data": [trace1, trace2],
-        "layout": go.Layout(
-            title=f"Comparison of {selected_metric.replace('_', ' ').title()} between {current_year} and {previous_year}",
-            xaxis={"title": "Month"},
-            yaxis={"title": selected_metric.replace("_", " ").title()},
-        ),
+        "type": "scatter",
+        "x": values.index.strftime("%Y-%m-%d").tolist(),
+        "y": values.to_numpy(),
+        "mode": "lines+markers",
+        "name": name,
+        "marker": {"color": color},
+        "line": {"dash": dash},
     }
 
 
-@app.callback(
-    Output("live-race-sales-gauge", "figure"),
-    [Input("month-dropdown", "value")],
-)
-def update_live_racing_revenue_gauge(selected_month):
-    selected_year = int(df["year"].max())
-    total_sales = (
-        df[(df["year"] == selected_year) & (df["month_name"] == selected_month)][
-            "live_racing_revenue"
-        ].sum()
-        / 1e6
-    )
-    sales_target = get_sales_target("live-targets", selected_month, selected_year) / 1e6
-    bar_color = "#00a2ff"
-    step_color = "#e5f6fd"
+# Parts of the gauges that change with the month; everything else, including the bulky
+# template, stays as first rendered in the layout
+revenue_gauge_patch_paths = [
+    ("data", 0, "value"),
+    ("data", 0, "title", "text"),
+    ("data", 0, "gauge", "axis", "range"),
+    ("data", 0, "gauge", "steps", 0, "range"),
+    ("data", 0, "gauge", "steps", 1, "range"),
+    ("data", 0, "gauge", "threshold", "value"),
+    ("layout", "annotations", 0, "text"),
+]
 
-    # Use max to ensure the gauge's range accommodates both sales and target
-    max_range = max(sales_target, total_sales)
 
-    title_text = f"Live Racing Revenue for {selected_month} {selected_year} (Millions)"
-
-    fig_live_races = go.Figure(
-        go.Indicator(
-            mode="gauge+number",
-            value=total_sales,
-            number={"suffix": "M"},
-            domain={"x": [0, 1], "y": [0, 1]},
-            title={"text": title_text},
-            gauge={
-                "axis": {"range": [0, max_range]},
-                "bar": {"color": bar_color},
-                "steps": [
-                    {"range": [0, sales_target], "color": step_color},
-                    {"range": [sales_target, max_range], "color": excess_step_color},
-                ],
-                "threshold": {
-                    "line": {"color": "red", "width": 4},
-                    "thickness": 0.75,
-                    "value": sales_target,
-                },
-            },
-        )
-    )
+def figure_patch(figure, paths):
+    # A dash.Patch assigning just the given paths of a freshly built figure
+    patch = Patch()
+    for path in paths:
+        value = figure
+        target = patch
+        for key in path[:-1]:
+            value = value[key]
+            target = target[key]
+        target[path[-1]] = value[path[-1]]
+    return patch
 
-    # Add annotation for the target
-    fig_live_races.add_annotation(
-        x=0.5,
-        y=0.3,
-        text=f"Target: {sales_target:.2f}M",
-        showarrow=False,
-        font=dict(size=16, color="#475569"),
-    )
 
-    return fig_live_races
+# The default plotly template, which go.Figure would embed in every figure's layout.
+# Read from plotly's package data so plotly.graph_objs is never needed.
+@functools.lru_cache(maxsize=None)
+def get_figure_template():
+    return json.loads(pkgutil.get_data("plotly", "package_data/templates/plotly.json"))
 
 
-@app.callback(
-    Output("simulcast-sales-gauge", "figure"),
-    [Input("month-dropdown", "value")],
-)
-def update_simulcast_revenue_gauge(selected_month):
-    selected_year = int(df["year"].max())
-    total_sales = (
-        df[(df["year"] == selected_year) & (df["month_name"] == selected_month)][
-            "simulcast_revenue"
-        ].sum()
-        / 1e6
+# Live Racing revenue gauge for the month slice of the selected year
+def update_live_racing_revenue_gauge(selected_month, selected_year, month_data, sales_target):
+    total_sales = month_data["live_racing_revenue"].sum()
+    return revenue_gauge(
+        "Live Racing Revenue", live_racing_gauge_colors, selected_month, selected_year, total_sales, sales_target
     )
-    sales_target = (
-        get_sales_target("simulcast-targets", selected_month, selected_year) / 1e6
+
+
+# Simulcast revenue gauge for the month slice of the selected year
+def update_simulcast_revenue_gauge(selected_month, selected_year, month_data, sales_target):
+    total_sales = month_data["simulcast_revenue"].sum()
+    return revenue_gauge(
+        "Simulcast Revenue", simulcast_gauge_colors, selected_month, selected_year, total_sales, sales_target
     )
-    bar_color = "#fa8231"
-    step_color = "#ffe5d8"
+
+
+def revenue_gauge(title, colors, selected_month, selected_year, total_sales, sales_target):
+    total_sales = total_sales / 1e6
+    sales_target = sales_target / 1e6
 
     # Use max to ensure the gauge's range accommodates both sales and target
     max_range = max(sales_target, total_sales)
 
-    title_text = f"Simulcast Revenue for {selected_month} {selected_year} (Millions)"
-
-    fig_simulcast = go.Figure(
-        go.Indicator(
-            mode="gauge+number",
-            value=total_sales,
-            number={"suffix": "M"},
-            domain={"x": [0, 1], "y": [0, 1]},
-            title={"text": title_text},
-            gauge={
-                "axis": {"range": [0, max_range]},
-                "bar": {"color": bar_color},
-                "steps": [
-                    {"range": [0, sales_target], "color": step_color},
-                    {"range": [sales_target, max_range], "color": excess_step_color},
-                ],
-                "threshold": {
-                    "line": {"color": "red", "width": 4},
-                    "thickness": 0.75,
-                    "value": sales_target,
+    return {
+        "data": [
+            {
+                "type": "indicator",
+                "mode": "gauge+number",
+                "value": total_sales,
+                "number": {"suffix": "M"},
+                "domain": {"x": [0, 1], "y": [0, 1]},
+                "title": {"text": f"{title} for {selected_month} {selected_year} (Millions)"},
+                "gauge": {
+                    "axis": {"range": [0, max_range]},
+                    "bar": {"color": colors["bar"]},
+                    "steps": [
+                        {"range": [0, sales_target], "color": colors["step"]},
+                        {"range": [sales_target, max_range], "color": excess_step_color},
+                    ],
+                    "threshold": {
+                        "line": {"color": "red", "width": 4},
+                        "thickness": 0.75,
+                        "value": sales_target,
+                    },
                 },
-            },
-        )
-    )
+            }
+        ],
+        "layout": {
+            # Annotation for the target
+            "annotations": [
+                {
+                    "x": 0.5,
+                    "y": 0.3,
+                    "text": f"Target: {sales_target:.2f}M",
+                    "showarrow": False,
+                    "font": {"size": 16, "color": "#475569"},
+                }
+            ],
+            "template": get_figure_template(),
+        },
+    }
 
-    # Add annotation for the target
-    fig_simulcast.add_annotation(
-        x=0.5,
-        y=0.3,
-        text=f"Target: {sales_target:.2f}M",
-        showarrow=False,
-        font=dict(size=16, color="#475569"),
+
+# Everything the clientside callbacks need, computed once per data and targets version
+def get_clientside_data(snapshot):
+    key = (
+        "clientside_data",
+        sales_targets.version("live-targets"),
+        sales_targets.version("simulcast-targets"),
     )
+    return snapshot.derive(key, lambda sales: build_clientside_data(snapshot))
+
+
+def build_clientside_data(snapshot):
+    # Values for every year, so the browser can compare any range of them
+    sales = snapshot.sales
+    comparison_cube = snapshot.derive("comparison_cube", build_comparison_cube)
+    years = comparison_cube.years
+    all_years = (years[0], years[-1])
+    all_rows = sales.rows_between(*all_years)
+    month_totals = all_rows.groupby(["year", "month"], observed=False)[["live_racing_revenue", "simulcast_revenue"]].sum()
+
+    def values(array):
+        return [None if np.isnan(value) else float(value) for value in array]
+
+    def year_totals(column):
+        totals = month_totals[column].reindex(pd.MultiIndex.from_product([years, month_order]), fill_value=0)
+        return values(totals.to_numpy(dtype=float).reshape(len(years), len(month_order)).ravel())
+
+    def year_targets(target_file):
+        return [float(get_sales_target(target_file, month, year)) for year in years for month in month_order]
+
+    def year_series(metric, frequency):
+        # Every year's series, thinned as comparison_trace would draw it
+        series = get_kpi_series(metric, frequency, all_years, snapshot)
+        thinned = {year: downsample_series(series[year], KPI_GRAPH_MAX_POINTS) for year in years}
+        return {
+            year: {"x": points.index.strftime("%Y-%m-%d").tolist(), "y": values(points.to_numpy(dtype=float))}
+            for year, points in thinned.items()
+        }
+
+    return {
+        "months": month_order,
+        "years": years,
+        "default_years": list(get_year_range(None, snapshot)),
+        # Monthly values per year (years x months, flattened) for every metric
+        "values": {
+            metric: values(comparison_cube.values[:, :, i].ravel()) for i, metric in enumerate(comparison_cube.metrics)
+        },
+        "tables": {
+            "live": {"metrics": live_races_metrics, "style": live_races_table_style},
+            "simulcast": {"metrics": simulcast_metrics, "style": simulcast_table_style},
+        },
+        # Month totals and targets per year (years x months, flattened)
+        "gauges": {
+            "live": {
+                "title": "Live Racing Revenue",
+                "colors": live_racing_gauge_colors,
+                "totals": year_totals("live_racing_revenue"),
+                "targets": year_targets("live-targets"),
+            },
+            "simulcast": {
+                "title": "Simulcast Revenue",
+                "colors": simulcast_gauge_colors,
+                "totals": year_totals("simulcast_revenue"),
+                "targets": year_targets("simulcast-targets"),
+            },
+            "excess_step_color": excess_step_color,
+            "template": get_figure_template(),
+        },
+        # The KPI graph's series for every metric, frequency and year
+        "graphs": {
+            "series": {
+                metric: {frequency: year_series(metric, frequency) for frequency in FREQUENCIES}
+                for metric in comparison_cube.metrics
+            },
+            "axes": {
+                frequency: {"title": {"text": axis_title}, "type": "date", **kpi_axis_formats[frequency]}
+                for frequency, axis_title in FREQUENCIES.items()
+            },
+            "older_year_colors": older_year_colors,
+        },
+    }
 
-    return fig_simulcast
+
+app.layout = serve_layout
+
+if CLIENTSIDE_RENDERING:
+    # The same outputs, computed in the browser by assets/js/dashboard.js
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="updateMonthOutputs"),
+        Output("live-races-comparison-table", "children"),
+        Output("simulcast-comparison-table", "children"),
+        Output("live-race-sales-gauge", "figure"),
+        Output("simulcast-sales-gauge", "figure"),
+        Input("month-dropdown", "value"),
+        Input("year-range-slider", "value"),
+        Input("dashboard-data", "data"),
+        prevent_initial_call=True,
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="updateGraph"),
+        Output("monthly-metric-comparison-graph", "figure"),
+        Input("metric-dropdown", "value"),
+        Input("frequency-dropdown", "value"),
+        Input("year-range-slider", "value"),
+        Input("dashboard-data", "data"),
+        prevent_initial_call=True,
+    )
+else:
+    app.callback(
+        Output("live-races-comparison-table", "children"),
+        Output("simulcast-comparison-table", "children"),
+        Output("live-race-sales-gauge", "figure"),
+        Output("simulcast-sales-gauge", "figure"),
+        Input("month-dropdown", "value"),
+        Input("year-range-slider", "value"),
+        prevent_initial_call=True,
+    )(update_month_outputs)
+    app.callback(
+        Output("monthly-metric-comparison-graph", "figure"),
+        [
+            Input("metric-dropdown", "value"),
+            Input("frequency-dropdown", "value"),
+            Input("year-range-slider", "value"),
+            Input("kpi-graph-view", "data"),
+        ],
+        prevent_initial_call=True,
+    )(update_graph)
+    app.clientside_callback(
+        ClientsideFunction(namespace="dashboard", function_name="graphView"),
+        Output("kpi-graph-view", "data"),
+        Input("monthly-metric-comparison-graph", "relayoutData"),
+        prevent_initial_call=True,
+    )
 
 
 # Step 5: Run the Dash App
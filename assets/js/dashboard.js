@@ -0,0 +1,228 @@
+// Clientside rendering mode (CLIENTSIDE_RENDERING=1 in app.py). These functions mirror the
+// server callbacks in app.py and build the same outputs from the "dashboard-data" store.
+// graphView is used in the default server mode instead, to filter the KPI graph's
+// relayout events before they reach the server.
+(function () {
+    function isMissing(value) {
+        return value === null || value === undefined || Number.isNaN(value);
+    }
+
+    function formatNumber(value) {
+        return value.toLocaleString("en-US", { minimumFractionDigits: 2, maximumFractionDigits: 2 });
+    }
+
+    function formatPercentageChange(value) {
+        if (isMissing(value) || value === 0) {
+            return "No Change";
+        }
+        return (value > 0 ? "Up " : "Down ") + Math.abs(value).toFixed(2) + "%";
+    }
+
+    function formatCurrency(value) {
+        if (isMissing(value)) {
+            return "-";
+        }
+        return (value < 0 ? "-$" : "$") + formatNumber(Math.abs(value));
+    }
+
+    function formatValue(metricName, value) {
+        if (isMissing(value)) {
+            return "-";
+        }
+        if (metricName.includes("Revenue") || metricName.includes("Purse Structure") || metricName.includes("Average")) {
+            return formatCurrency(value);
+        }
+        return String(Math.trunc(value));
+    }
+
+    function percentageChange(before, after) {
+        if (isMissing(before) || isMissing(after) || before === 0) {
+            return null;
+        }
+        return ((after - before) / before) * 100;
+    }
+
+    // The (first, last) years to compare, as get_year_range in app.py picks them
+    function yearRange(data, yearRange) {
+        var firstYear = data.years[0];
+        var lastYear = data.years[data.years.length - 1];
+        if (!yearRange || !yearRange.length) {
+            return data.default_years;
+        }
+        var years = yearRange.map(function (year) {
+            return Math.min(Math.max(year, firstYear), lastYear);
+        });
+        return [Math.min.apply(null, years), Math.max.apply(null, years)];
+    }
+
+    // A metric's value for a year and month, from the years x months values
+    function monthValue(data, values, year, monthIndex) {
+        return monthIndex < 0 ? null : values[(year - data.years[0]) * data.months.length + monthIndex];
+    }
+
+    function tableColumns(firstYear, lastYear) {
+        var columns = [{ name: "Metric", id: "Metric" }];
+        for (var year = firstYear; year <= lastYear; year++) {
+            columns.push({ name: String(year), id: String(year) });
+        }
+        columns.push({ name: "Variance", id: "Variance" }, { name: "Percentage Change", id: "Percentage Change" });
+        if (lastYear - firstYear > 1) {
+            columns.push({ name: "YoY", id: "YoY" }, { name: "CAGR", id: "CAGR" });
+        }
+        return columns;
+    }
+
+    function comparisonTable(data, table, monthIndex, years) {
+        var firstYear = years[0];
+        var lastYear = years[1];
+        var span = lastYear - firstYear;
+        var records = Object.keys(table.metrics).map(function (metricName) {
+            var values = data.values[table.metrics[metricName]];
+            var record = { Metric: metricName };
+            for (var year = firstYear; year <= lastYear; year++) {
+                record[String(year)] = formatValue(metricName, monthValue(data, values, year, monthIndex));
+            }
+            var first = monthValue(data, values, firstYear, monthIndex);
+            var last = monthValue(data, values, lastYear, monthIndex);
+            record.Variance = formatValue(metricName, isMissing(first) || isMissing(last) ? null : last - first);
+            record["Percentage Change"] = formatPercentageChange(percentageChange(first, last));
+            if (span > 1) {
+                var previous = monthValue(data, values, lastYear - 1, monthIndex);
+                var cagr = first > 0 && last > 0 ? (Math.pow(last / first, 1 / span) - 1) * 100 : null;
+                record.YoY = formatPercentageChange(percentageChange(previous, last));
+                record.CAGR = formatPercentageChange(cagr);
+            }
+            return record;
+        });
+        return {
+            namespace: "dash_table",
+            type: "DataTable",
+            props: Object.assign({ data: records, columns: tableColumns(firstYear, lastYear) }, table.style),
+        };
+    }
+
+    function revenueGauge(data, gauge, selectedMonth, monthIndex, selectedYear) {
+        var totalSales = monthIndex < 0 ? 0 : monthValue(data, gauge.totals, selectedYear, monthIndex) / 1e6;
+        var salesTarget = monthIndex < 0 ? 0 : monthValue(data, gauge.targets, selectedYear, monthIndex) / 1e6;
+        var maxRange = Math.max(salesTarget, totalSales);
+        return {
+            data: [
+                {
+                    type: "indicator",
+                    mode: "gauge+number",
+                    value: totalSales,
+                    number: { suffix: "M" },
+                    domain: { x: [0, 1], y: [0, 1] },
+                    title: { text: gauge.title + " for " + selectedMonth + " " + selectedYear + " (Millions)" },
+                    gauge: {
+                        axis: { range: [0, maxRange] },
+                        bar: { color: gauge.colors.bar },
+                        steps: [
+                            { range: [0, salesTarget], color: gauge.colors.step },
+                            { range: [salesTarget, maxRange], color: data.gauges.excess_step_color },
+                        ],
+                        threshold: { line: { color: "red", width: 4 }, thickness: 0.75, value: salesTarget },
+                    },
+                },
+            ],
+            layout: {
+                annotations: [
+                    {
+                        x: 0.5,
+                        y: 0.3,
+                        text: "Target: " + salesTarget.toFixed(2) + "M",
+                        showarrow: false,
+                        font: { size: 16, color: "#475569" },
+                    },
+                ],
+                template: data.gauges.template,
+            },
+        };
+    }
+
+    // (year, name, color, dash) of every year's trace, newest first, as year_trace_styles
+    // in app.py draws them
+    function yearTraceStyles(data, firstYear, lastYear) {
+        var styles = [[lastYear, "Current Year (" + lastYear + ")", "blue", "solid"]];
+        if (lastYear > firstYear) {
+            styles.push([lastYear - 1, "Previous Year (" + (lastYear - 1) + ")", "#aaaaaa", "dot"]);
+        }
+        var colors = data.graphs.older_year_colors;
+        for (var year = lastYear - 2, i = 0; year >= firstYear; year--, i++) {
+            styles.push([year, String(year), colors[i % colors.length], "dot"]);
+        }
+        return styles;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        dashboard: {
+            updateMonthOutputs: function (selectedMonth, selectedYears, data) {
+                var monthIndex = data.months.indexOf(selectedMonth);
+                var years = yearRange(data, selectedYears);
+                return [
+                    comparisonTable(data, data.tables.live, monthIndex, years),
+                    [comparisonTable(data, data.tables.simulcast, monthIndex, years)],
+                    revenueGauge(data, data.gauges.live, selectedMonth, monthIndex, years[1]),
+                    revenueGauge(data, data.gauges.simulcast, selectedMonth, monthIndex, years[1]),
+                ];
+            },
+
+            graphView: function (relayoutData) {
+                // Forward only changes of the x range to the "kpi-graph-view" store:
+                // { range: [start, end] } for a zoom or pan, {} for autoscale. Autosizing
+                // and y-only zooms leave the store alone, so they make no server request.
+                var noUpdate = window.dash_clientside.no_update;
+                if (!relayoutData) {
+                    return noUpdate;
+                }
+                if (relayoutData["xaxis.autorange"]) {
+                    return {};
+                }
+                if ("xaxis.range[0]" in relayoutData) {
+                    return { range: [relayoutData["xaxis.range[0]"], relayoutData["xaxis.range[1]"]] };
+                }
+                if ("xaxis.range" in relayoutData) {
+                    return { range: relayoutData["xaxis.range"] };
+                }
+                return noUpdate;
+            },
+
+            updateGraph: function (selectedMetric, frequency, selectedYears, data) {
+                // Resampling needs the daily rows, so every year's series is prebuilt
+                var years = yearRange(data, selectedYears);
+                var series = data.graphs.series[selectedMetric][frequency];
+                var title = selectedMetric
+                    .split("_")
+                    .map(function (word) {
+                        return word.charAt(0).toUpperCase() + word.slice(1);
+                    })
+                    .join(" ");
+                var graphTitle = "Comparison of " + title + " from " + years[0] + " to " + years[1];
+                if (years[0] === years[1]) {
+                    graphTitle = title + " in " + years[1];
+                } else if (years[1] - years[0] === 1) {
+                    graphTitle = "Comparison of " + title + " between " + years[1] + " and " + years[0];
+                }
+                return {
+                    data: yearTraceStyles(data, years[0], years[1]).map(function (style) {
+                        var points = series[String(style[0])];
+                        return {
+                            type: "scatter",
+                            x: points.x,
+                            y: points.y,
+                            mode: "lines+markers",
+                            name: style[1],
+                            marker: { color: style[2] },
+                            line: { dash: style[3] },
+                        };
+                    }),
+                    layout: {
+                        title: { text: graphTitle },
+                        xaxis: data.graphs.axes[frequency],
+                        yaxis: { title: { text: title } },
+                    },
+                };
+            },
+        },
+    });
+})();
@@ -0,0 +1,205 @@
+# Callback and ingestion latency benchmarks on synthetic datasets.
+#
+#   python -m benchmarks.run                                  # every dataset
+#   python -m benchmarks.run --datasets monthly-2y --repeat 50
+#   python -m benchmarks.run --baseline benchmarks/baseline.json
+#
+# Results (p50/p95/max latency and peak traced memory per benchmark) are written as JSON to
+# --output. Pass a previous results file as --baseline to flag p50 regressions; the command
+# exits with status 1 when any benchmark is slower than the baseline by more than
+# --tolerance.
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import DATASETS, generate_dataset
+from data_store import SALES_COLUMNS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(REPO_ROOT, "benchmarks", "results", "latest.json")
+
+
+def measure(func, calls, repeat):
+    # Time every call in `calls` (a list of argument tuples) `repeat` times, then run them
+    # once more under tracemalloc to get the peak memory allocated by a single call
+    timings = []
+    for _ in range(repeat):
+        for args in calls:
+            start = time.perf_counter()
+            func(*args)
+            timings.append(time.perf_counter() - start)
+
+    peak = 0
+    for args in calls:
+        tracemalloc.start()
+        func(*args)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    timings_ms = np.array(timings) * 1000
+    return {
+        "runs": len(timings),
+        "p50_ms": round(float(np.percentile(timings_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(timings_ms, 95)), 4),
+        "max_ms": round(float(timings_ms.max()), 4),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def run_dataset(name, work_dir, repeat):
+    # Runs inside a fresh interpreter (see main), with SALES_DATA_DIR pointing at this
+    # dataset, so app.py loads the synthetic data at import exactly as it would in gunicorn
+    paths = generate_dataset(name, work_dir)
+    csvs_dir = os.environ["SALES_DATA_DIR"]
+    os.makedirs(csvs_dir, exist_ok=True)
+    sales_csv = os.path.join(csvs_dir, "sales.csv")
+
+    import data_processing
+
+    results = {}
+    results["ingest_full"] = measure(
+        lambda: data_processing.consolidate_excel_sheets_to_csv(paths["sales"], sales_csv, incremental=False),
+        [()],
+        max(1, repeat // 10),
+    )
+    # Nothing changed since the full run, so every sheet comes from the manifest
+    results["ingest_incremental"] = measure(
+        lambda: data_processing.consolidate_excel_sheets_to_csv(paths["sales"], sales_csv),
+        [()],
+        repeat,
+    )
+    results["ingest_targets"] = measure(
+        lambda: [
+            data_processing.excel_to_csv_targets(paths[kind], os.path.join(csvs_dir, kind + ".csv"))
+            for kind in ("live-targets", "simulcast-targets")
+        ],
+        [()],
+        max(1, repeat // 10),
+    )
+
+    start = time.perf_counter()
+    import app
+
+    results["app_import"] = {"runs": 1, "p50_ms": round((time.perf_counter() - start) * 1000, 4)}
+
+    from analytics import FREQUENCIES, build_comparison_cube
+
+    snapshot = app.data_snapshots.current()
+    months = [(month,) for month in app.month_order]
+    metrics = [(metric, frequency) for metric in SALES_COLUMNS for frequency in FREQUENCIES]
+
+    results["comparison_cube"] = measure(lambda: build_comparison_cube(snapshot.sales), [()], repeat)
+    results["update_month_outputs"] = measure(app.update_month_outputs, months, repeat)
+    results["update_graph"] = measure(app.render_graph, metrics, repeat)
+    # The same callbacks comparing every year in the dataset
+    all_years = list(snapshot.sales.year_range())
+    results["update_month_outputs_all_years"] = measure(
+        app.update_month_outputs, [(month, all_years) for (month,) in months], repeat
+    )
+    results["update_graph_all_years"] = measure(
+        app.render_graph, [(metric, frequency, all_years) for metric, frequency in metrics], repeat
+    )
+    results["serve_layout"] = measure(app.serve_layout, [()], repeat)
+    results["build_clientside_data"] = measure(lambda: app.build_clientside_data(snapshot), [()], repeat)
+
+    results["rows"] = len(snapshot.sales.rows_between(*snapshot.sales.year_range()))
+    results["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Print the p50 change against a baseline results file; returns the regressions
+    regressions = []
+    for dataset, benchmarks in results["datasets"].items():
+        for benchmark, stats in benchmarks.items():
+            previous = baseline.get("datasets", {}).get(dataset, {}).get(benchmark)
+            if not isinstance(stats, dict) or not isinstance(previous, dict) or not previous.get("p50_ms"):
+                continue
+            ratio = stats["p50_ms"] / previous["p50_ms"]
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = "  REGRESSION"
+                regressions.append((dataset, benchmark, ratio))
+            print(f"  {dataset:<14} {benchmark:<24} {previous['p50_ms']:>10.3f} -> {stats['p50_ms']:>10.3f} ms  {ratio:5.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard callbacks and ingestion on synthetic data")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions of each callback call")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_dataset(args.worker, args.work_dir, args.repeat)))
+        return
+
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "datasets": {},
+    }
+    for name in args.datasets:
+        work_dir = tempfile.mkdtemp(prefix=f"svrel-bench-{name}-")
+        try:
+            env = dict(
+                os.environ,
+                SALES_DATA_DIR=os.path.join(work_dir, "csvs"),
+                CALLBACK_CACHE_SIZE="0",  # Measure the computation, not the shared cache
+                DATA_RELOAD_INTERVAL="3600",
+            )
+            print(f"Running {name}...", file=sys.stderr)
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "--worker", name, "--work-dir", work_dir, "--repeat", str(args.repeat)],
+                cwd=REPO_ROOT,
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results["datasets"][name] = json.loads(output.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for name, benchmarks in results["datasets"].items():
+        print(f"{name} ({benchmarks['rows']} rows, max RSS {benchmarks['max_rss_mb']} MB)")
+        for benchmark, stats in benchmarks.items():
+            if isinstance(stats, dict) and "p95_ms" in stats:
+                print(
+                    f"  {benchmark:<24} p50 {stats['p50_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms  "
+                    f"max {stats['max_ms']:>10.3f} ms  peak {stats['peak_memory_kb']:>9.1f} KiB"
+                )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline}:")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
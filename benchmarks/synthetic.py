@@ -0,0 +1,89 @@
+import datetime
+import os
+import random
+
+import openpyxl
+
+# Synthetic datasets of increasing size. Every dataset is a sales workbook laid out like
+# data/spreadsheets/sales.xlsx (one sheet per month, daily rows, then TOTAL rows in
+# columns F-I) plus live and simulcast targets workbooks.
+DATASETS = {
+    # Two years of monthly data, about the size of the real workbook
+    "monthly-2y": {"years": 2, "venues": 1},
+    # Twenty years of monthly history
+    "monthly-20y": {"years": 20, "venues": 1},
+    # Daily rows for many venues: every month sheet holds one row per race day and venue
+    "daily-venues": {"years": 5, "venues": 25},
+}
+
+# Sheet names before January 2023 are skipped by ingestion, so history starts there
+FIRST_YEAR = 2023
+
+
+def month_starts(years):
+    for i in range(years * 12):
+        yield datetime.datetime(FIRST_YEAR + i // 12, i % 12 + 1, 1)
+
+
+def write_sales_workbook(path, years, venues, seed=0):
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    for month in month_starts(years):
+        sheet = workbook.create_sheet(month.strftime("%B %Y"))
+        sheet.append(["LOCAL"])
+        sheet.append(["DATE", "# OF RACES", "SALES", "PURSE", None, "DATE", "# OF RACES", "SALES", "PURSE"])
+
+        live_races = live_sales = live_purse = 0
+        for day in range(1, 29, 2):
+            for _ in range(venues):
+                races = rng.randint(8, 11)
+                sales = round(rng.uniform(5e7, 8e7) / venues, 2)
+                purse = round(sales * 0.13, 2)
+                date = month.replace(day=day)
+                sheet.append([date.replace(year=date.year - 1), races, sales, purse, None, date, races, sales, purse])
+                live_races += races
+                live_sales += sales
+                live_purse += purse
+        sheet.append(["TOTAL", live_races, live_sales, live_purse, None, "TOTAL", live_races, live_sales, live_purse])
+        sheet.append(["AVERAGE"])
+
+        sheet.append(["SIMULCAST"])
+        sheet.append(["WEEK ENDING", "DAYS", "SALES", "AVG.", None, "WEEK ENDING", "DAYS", "SALES", "AVG."])
+        simulcast_days = simulcast_sales = 0
+        for week in range(4):
+            days = 7
+            sales = round(rng.uniform(6e7, 9e7), 2)
+            date = month.replace(day=7 * week + 7)
+            sheet.append([date.replace(year=date.year - 1), days, sales, sales / days, None, date, days, sales, sales / days])
+            simulcast_days += days
+            simulcast_sales += sales
+        average = simulcast_sales / simulcast_days
+        sheet.append(["TOTAL", simulcast_days, simulcast_sales, average, None, "TOTAL", simulcast_days, simulcast_sales, average])
+        sheet.append(["GRAND TOTAL", None, live_sales + simulcast_sales, None, None, "GRAND TOTAL", None, live_sales + simulcast_sales])
+    workbook.save(path)
+
+
+def write_targets_workbook(path, years, seed=0):
+    rng = random.Random(seed)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(["Month", "Target"])
+    for month in month_starts(years):
+        sheet.append([month, round(rng.uniform(3e8, 6e8), 2)])
+    workbook.save(path)
+
+
+def generate_dataset(name, directory):
+    # Write the spreadsheets for one dataset into directory/spreadsheets; returns their paths
+    spec = DATASETS[name]
+    spreadsheets_dir = os.path.join(directory, "spreadsheets")
+    os.makedirs(spreadsheets_dir, exist_ok=True)
+    paths = {
+        "sales": os.path.join(spreadsheets_dir, "sales.xlsx"),
+        "live-targets": os.path.join(spreadsheets_dir, "live-targets.xlsx"),
+        "simulcast-targets": os.path.join(spreadsheets_dir, "simulcast-targets.xlsx"),
+    }
+    write_sales_workbook(paths["sales"], spec["years"], spec["venues"])
+    write_targets_workbook(paths["live-targets"], spec["years"], seed=1)
+    write_targets_workbook(paths["simulcast-targets"], spec["years"], seed=2)
+    return paths
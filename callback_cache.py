@@ -0,0 +1,110 @@
+import functools
+import glob
+import json
+import os
+import sqlite3
+import time
+
+from plotly.utils import PlotlyJSONEncoder
+
+from data_store import ThreadLocalConnection
+
+# Shared by every gunicorn worker of the deployment, so a result computed by one worker is
+# reused by the others. Cached results are sent to browsers as they are, so the file lives
+# in a directory only the app's user can write to, never a shared one like /tmp. Set
+# CALLBACK_CACHE_SIZE=0 to turn the cache off.
+CALLBACK_CACHE_PATH = os.environ.get(
+    "CALLBACK_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache", "callback-cache.sqlite"),
+)
+CALLBACK_CACHE_SIZE = int(os.environ.get("CALLBACK_CACHE_SIZE", "512"))
+
+
+class CallbackCache:
+    # Size-bounded LRU cache of callback results in a SQLite file. Entries are keyed on
+    # (callback name, inputs, data version, settings), so publishing new data never serves
+    # stale output; old versions simply age out of the LRU. settings holds the
+    # configuration that changes what the callbacks return, such as the storage engine.
+    def __init__(self, path=CALLBACK_CACHE_PATH, max_entries=CALLBACK_CACHE_SIZE, on_lookup=None, settings=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.settings = settings or {}
+        # Called as on_lookup(name, hit) after every lookup, e.g. to export hit rates
+        self.on_lookup = on_lookup
+        self.connections = ThreadLocalConnection(self.connect)
+        # Deploying new code must not serve results rendered by the old code
+        sources = glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))
+        self.code_version = max((os.stat(source).st_mtime_ns for source in sources), default=0)
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        return conn
+
+    def connection(self):
+        return self.connections.get()
+
+    def get(self, key):
+        # Returns (hit, value)
+        conn = self.connection()
+        row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        try:
+            value = json.loads(row[0])
+        except ValueError:
+            return False, None  # Unreadable entry; it is overwritten by the fresh result
+        conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return True, value
+
+    def set(self, key, value):
+        # value is the JSON text of a callback result
+        conn = self.connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, last_used) VALUES (?, ?, ?)",
+            (key, value, time.time()),
+        )
+        # Evict the least recently used entries beyond the size bound
+        conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def memoize(self, name, version):
+        # Decorator for a Dash callback. `version` is called on every invocation and must
+        # return something that changes whenever the callback's data changes.
+        def decorator(func):
+            if self.max_entries <= 0:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = json.dumps([name, args, version(), self.settings, self.code_version], default=str)
+                try:
+                    hit, value = self.get(key)
+                except sqlite3.Error as e:
+                    print(f"Callback cache unavailable, computing {name} directly: {e}")
+                    return func(*args)
+                if self.on_lookup:
+                    self.on_lookup(name, hit)
+                if hit:
+                    return value
+
+                value = func(*args)
+                try:
+                    # Stored the way Dash serialises the response, so a hit returns plain
+                    # dicts/lists instead of rebuilding (and re-validating) figure objects
+                    self.set(key, json.dumps(value, cls=PlotlyJSONEncoder))
+                except sqlite3.Error as e:
+                    print(f"Could not store {name} in the callback cache: {e}")
+                return value
+
+            return wrapper
+
+        return decorator
@@ -1,71 +1,480 @@
+import argparse
+import datetime
+import json
+import math
+import os
+import posixpath
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 
-def get_index_of_totals(df):
-    # Locate the row with 'TOTAL' in the 'F' column, which indicates the total values
-    return df.index[df.iloc[:, 5].str.contains('TOTAL', case=False, na=False)].tolist()
-
-def consolidate_excel_sheets_to_csv(excel_path, output_csv_path):
-    xls = pd.ExcelFile(excel_path)
-    start_date = pd.to_datetime("2023-01-01")
-    consolidated_data = []
-
-    for sheet in xls.sheet_names:
-        try:
-            # Parse the sheet name into a date, if not possible, it will raise an error and continue
-            sheet_date = pd.to_datetime(sheet, errors='raise', format='%B %Y')
-            if sheet_date < start_date:
-                continue  # Skip the sheets before January 2023
-        except ValueError:
-            continue  # Skip sheet names that do not represent a month and year
-        
-        df = pd.read_excel(excel_path, sheet_name=sheet)
-
-        total_indices = get_index_of_totals(df)
-        if len(total_indices) < 2:
-            print(f"Not enough 'TOTAL' entries found in sheet: {sheet} - Found: {len(total_indices)}")
-            continue
-
-        # The index of the 'SALES' column should be 2 places after the 'F' column, which is index 5
-        sales_index = 7
-        purse_index = 8
-        days_index = 6  # This assumes 'DAYS' is the column immediately after 'F' for simulcast
-
-        # Create a dictionary for the row, ensuring to round values to 2 decimal places
-        row = {
-            'date': sheet_date.strftime('%B %Y'),
-            'number_of_live_races': int(df.iloc[total_indices[0], days_index]),
-			# TODO: Add Number of meets/Number of days
-            'live_racing_revenue': round(float(df.iloc[total_indices[0], sales_index]), 2),
-            'purse_structure': round(float(df.iloc[total_indices[0], purse_index]), 2),
-            'number_of_simulcast_days': int(df.iloc[total_indices[1], days_index]),
-            'simulcast_revenue': round(float(df.iloc[total_indices[1], sales_index]), 2),
-            'simulcast_daily_averages': round(float(df.iloc[total_indices[1], sales_index]) / int(df.iloc[total_indices[1], days_index]), 2),
-        }
-        consolidated_data.append(row)
-
-    # Convert the list of dictionaries into a DataFrame
-    consolidated_df = pd.DataFrame(consolidated_data)
-
-    # Save the DataFrame to a CSV file
-    consolidated_df.to_csv(output_csv_path, index=False)
-
-def excel_to_csv_targets(excel_path, csv_path):
+from data_store import SALES_COLUMNS, atomic_write, write_sales_store
+from history_store import HistoryStore
+from spreadsheet_readers import available_readers, open_workbook, read_frame
+
+# Bump this whenever the extraction logic changes so stale manifest rows are re-extracted
+MANIFEST_VERSION = 2
+
+SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Columns read from raw ticket exports: the ticket's date (or timestamp), its channel
+# ("live" or "simulcast"), the race it was sold on, its amount, and the race's purse
+TICKET_EXPORT_COLUMNS = ["date", "channel", "race", "amount", "purse"]
+# Tickets parsed per chunk; bounds the memory used by aggregate_ticket_exports
+TICKET_CHUNK_SIZE = 500_000
+
+def stream_month_sheet(workbook, sheet):
+    # Return (totals_rows, day_rows) from columns F-I: the first two TOTAL rows (live
+    # racing, then simulcast), and the dated rows above each of them (live race days, then
+    # simulcast weeks). The sheet is walked row by row, reading only columns F-I and
+    # stopping as soon as both TOTAL rows are found. The first row is skipped because
+    # pandas treats it as the header.
+    totals_rows = []
+    day_rows = ([], [])
+    for row in workbook.iter_rows(sheet, min_row=2, min_col=6, max_col=9):
+        label = row[0]
+        if isinstance(label, str) and 'TOTAL' in label.upper():
+            totals_rows.append(row)
+            if len(totals_rows) == 2:
+                break
+        elif isinstance(label, datetime.date):
+            day_rows[len(totals_rows)].append(row)
+    return totals_rows, day_rows
+
+def parse_sheet_date(sheet, start_date=pd.Timestamp("2023-01-01")):
+    try:
+        # Parse the sheet name into a date, if not possible, it will raise an error and continue
+        sheet_date = pd.to_datetime(sheet, errors='raise', format='%B %Y')
+    except ValueError:
+        return None  # Skip sheet names that do not represent a month and year
+    if sheet_date < start_date:
+        return None  # Skip the sheets before January 2023
+    return sheet_date
+
+def get_sheet_fingerprints(excel_path):
+    # An .xlsx file is a zip archive with one XML part per worksheet. The CRC and size of
+    # each part are stored in the zip directory, so a sheet can be fingerprinted without
+    # decompressing or parsing it. Returns {sheet name: fingerprint} in workbook order.
+    with zipfile.ZipFile(excel_path) as archive:
+        workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+        rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(PACKAGE_REL_NS + "Relationship")}
+
+        fingerprints = {}
+        for sheet in workbook.iter(SPREADSHEET_NS + "sheet"):
+            target = targets[sheet.get(RELATIONSHIP_ID)]
+            # Targets are usually relative to xl/, but some writers use absolute part names
+            part = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+            info = archive.getinfo(posixpath.normpath(part))
+            fingerprints[sheet.get("name")] = f"{MANIFEST_VERSION}:{info.CRC:08x}:{info.file_size}"
+    return fingerprints
+
+def get_manifest_path(output_csv_path):
+    return os.path.splitext(output_csv_path)[0] + "-manifest.json"
+
+def load_ingestion_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("sheets", {})
+
+def save_ingestion_manifest(manifest_path, excel_path, sheets):
+    manifest = {"version": MANIFEST_VERSION, "source": excel_path, "sheets": sheets}
+    with atomic_write(manifest_path) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+def consolidate_excel_sheets_to_csv(excel_path, output_csv_path, manifest_path=None, incremental=True, reader=None):
+    if manifest_path is None:
+        manifest_path = get_manifest_path(output_csv_path)
+
+    # Only month sheets that are new or whose content changed since the last run are
+    # re-extracted; every other row is merged back in from the ingestion manifest
+    fingerprints = {
+        sheet: fingerprint
+        for sheet, fingerprint in get_sheet_fingerprints(excel_path).items()
+        if parse_sheet_date(sheet) is not None
+    }
+    previous = load_ingestion_manifest(manifest_path) if incremental else {}
+    stale_sheets = [
+        sheet for sheet, fingerprint in fingerprints.items()
+        if previous.get(sheet, {}).get("fingerprint") != fingerprint
+    ]
+
+    extracted = extract_sales_rows(excel_path, stale_sheets, reader) if stale_sheets else {}
+
+    sheets = {}
+    for sheet, fingerprint in fingerprints.items():
+        entry = extracted[sheet] if sheet in extracted else previous[sheet]
+        sheets[sheet] = {"fingerprint": fingerprint, "row": entry["row"], "days": entry["days"]}
+
+    # Convert the list of dictionaries into a DataFrame, keeping the workbook's sheet order
+    consolidated_df = pd.DataFrame(
+        [entry["row"] for entry in sheets.values() if entry["row"] is not None], columns=["date", *SALES_COLUMNS]
+    )
+
+    # Save the DataFrame to a CSV file, plus the columnar store and the daily rows the
+    # dashboard loads at startup
+    write_sales_store(consolidated_df, output_csv_path, [day for entry in sheets.values() for day in entry["days"]])
+    save_ingestion_manifest(manifest_path, excel_path, sheets)
+
+    print(f"Ingested {excel_path}: {len(stale_sheets)} sheet(s) extracted, {len(sheets) - len(stale_sheets)} reused")
+
+def extract_sales_rows(excel_path, sheet_names, reader=None):
+    # Returns {sheet name: {"row": row, "days": days}}, where row is the month's totals
+    # (None for month sheets without usable totals) and days its daily rows. The workbook
+    # is opened once and every sheet is read from the same handle, instead of re-opening
+    # (and re-parsing) the whole file for each sheet.
+    consolidated_data = {}
+    with open_workbook(excel_path, reader) as workbook:
+        for sheet in sheet_names:
+            sheet_date = parse_sheet_date(sheet)
+            if sheet_date is not None:
+                totals_rows, day_rows = stream_month_sheet(workbook, sheet)
+                row = build_sales_row(sheet, sheet_date, totals_rows)
+                days = build_day_rows(day_rows) if row is not None else []
+                consolidated_data[sheet] = {"row": row, "days": days}
+
+    return consolidated_data
+
+def build_sales_row(sheet, sheet_date, totals_rows):
+    # totals_rows holds columns F-I of the live and simulcast TOTAL rows
+    if len(totals_rows) < 2:
+        print(f"Not enough 'TOTAL' entries found in sheet: {sheet} - Found: {len(totals_rows)}")
+        return None
+
+    # Offsets within F-I: 'DAYS' (or '# OF RACES') is G, 'SALES' is H and 'PURSE' is I
+    days_index = 1
+    sales_index = 2
+    purse_index = 3
+    live_total, simulcast_total = totals_rows
+
+    # Create a dictionary for the row, ensuring to round values to 2 decimal places
+    return {
+        'date': sheet_date.strftime('%B %Y'),
+        'number_of_live_races': int(live_total[days_index]),
+        # TODO: Add Number of meets/Number of days
+        'live_racing_revenue': round(total_value(live_total[sales_index]), 2),
+        'purse_structure': round(total_value(live_total[purse_index]), 2),
+        'number_of_simulcast_days': int(simulcast_total[days_index]),
+        'simulcast_revenue': round(total_value(simulcast_total[sales_index]), 2),
+        'simulcast_daily_averages': round(total_value(simulcast_total[sales_index]) / int(simulcast_total[days_index]), 2),
+    }
+
+def total_value(value):
+    # A blank SALES or PURSE cell in a TOTAL row is NaN (an empty CSV field), as pandas reads it
+    return math.nan if value is None else float(value)
+
+def read_ticket_chunks(export_path, chunksize=TICKET_CHUNK_SIZE):
+    # Yield bounded DataFrame chunks of a raw ticket export, normalised to one ticket per
+    # row with columns day, channel, race, amount and purse. Only the columns in
+    # TICKET_EXPORT_COLUMNS are parsed. purse is optional, and so is race for an export
+    # of simulcast tickets only: live races are counted by race, so a live ticket without
+    # one is an error rather than being folded into a single race per day.
+    header = pd.read_csv(export_path, nrows=0).columns
+    missing = {"date", "channel", "amount"} - set(header)
+    if missing:
+        raise ValueError(f"{export_path} is missing ticket export column(s): {', '.join(sorted(missing))}")
+
+    chunks = pd.read_csv(
+        export_path,
+        usecols=[column for column in TICKET_EXPORT_COLUMNS if column in header],
+        dtype={"channel": "string", "race": "string", "amount": "float64", "purse": "float64"},
+        chunksize=chunksize,
+    )
+    for chunk in chunks:
+        chunk["day"] = pd.to_datetime(chunk.pop("date"), format="ISO8601").dt.normalize()
+        chunk["channel"] = chunk["channel"].str.strip().str.lower()
+        # Simulcast tickets are wagers on races run elsewhere, so only the day is kept
+        live = chunk["channel"] == "live"
+        if "race" not in chunk:
+            if live.any():
+                raise ValueError(f"{export_path} has live tickets but no race column")
+            chunk["race"] = ""
+        elif chunk.loc[live, "race"].isna().any():
+            raise ValueError(f"{export_path} has live tickets without a race")
+        chunk["race"] = chunk["race"].fillna("").where(live, "")
+        if "purse" not in chunk:
+            chunk["purse"] = float("nan")
+        yield chunk[chunk["channel"].isin(["live", "simulcast"])]
+
+def aggregate_ticket_exports(export_paths, output_csv_path, chunksize=TICKET_CHUNK_SIZE, history_dir=None):
+    # Aggregate raw ticket exports into the monthly rows of sales.csv. Each chunk is reduced
+    # to one row per (day, channel, race) and folded into a running total of the same
+    # shape, so memory is bounded by the number of race days, not the number of tickets,
+    # and tickets may arrive in any date order, across any number of files. With
+    # history_dir, the per-race figures are also appended to the daily history store.
+    races = None
+    tickets = 0
+    for export_path in export_paths:
+        for chunk in read_ticket_chunks(export_path, chunksize):
+            tickets += len(chunk)
+            partial = chunk.groupby(["day", "channel", "race"]).agg(amount=("amount", "sum"), purse=("purse", "max"))
+            if races is not None:
+                partial = pd.concat([races, partial]).groupby(level=["day", "channel", "race"]).agg(
+                    {"amount": "sum", "purse": "max"}
+                )
+            races = partial
+
+    consolidated_df = build_monthly_ticket_rows(races)
+    write_sales_store(consolidated_df, output_csv_path, build_daily_ticket_rows(races))
+    if history_dir is not None and races is not None:
+        append_ticket_history(races, HistoryStore(history_dir))
+
+    print(f"Aggregated {tickets} ticket(s) from {len(export_paths)} export(s) into {len(consolidated_df)} month(s)")
+
+def append_ticket_history(races, store):
+    # Append the days after the end of the history store, one row per live race (numbered
+    # 1, 2, ... in race id order) plus a race 0 row with the day's simulcast sales. Days
+    # the store already holds are left alone, since the history is append-only.
+    day_range = store.day_range()
+    races = races.reset_index()
+    skipped = races["day"] <= day_range[1] if day_range else pd.Series(False, index=races.index)
+    if skipped.any():
+        print(f"Skipped {races.loc[skipped, 'day'].nunique()} day(s) already in the history store")
+
+    for day, day_races in races[~skipped].groupby("day"):
+        live = day_races[day_races["channel"] == "live"].sort_values("race")
+        rows = pd.DataFrame(
+            {
+                "race": range(1, len(live) + 1),
+                "live_racing_revenue": live["amount"].to_numpy(),
+                "purse_structure": live["purse"].to_numpy(),
+                "simulcast_revenue": 0.0,
+            }
+        )
+        simulcast_revenue = day_races.loc[day_races["channel"] == "simulcast", "amount"].sum()
+        if simulcast_revenue:
+            simulcast = pd.DataFrame({"race": [0], "live_racing_revenue": [0.0], "simulcast_revenue": [simulcast_revenue]})
+            rows = pd.concat([simulcast, rows])
+        store.append_day(day, rows)
+
+def build_daily_ticket_rows(races):
+    # One row per day with the day's live races, revenues and purse; a day with simulcast
+    # sales counts as one simulcast day
+    if races is None:
+        return []
+    races = races.reset_index()
+    live = races[races["channel"] == "live"].groupby("day").agg(
+        number_of_live_races=("race", "size"),
+        live_racing_revenue=("amount", "sum"),
+        purse_structure=("purse", "sum"),
+    )
+    simulcast = races[races["channel"] == "simulcast"].groupby("day").agg(simulcast_revenue=("amount", "sum"))
+    simulcast["number_of_simulcast_days"] = 1
+    daily = live.join(simulcast, how="outer")
+    daily.insert(0, "date", daily.index.strftime("%Y-%m-%d"))
+    return daily.to_dict("records")
+
+def build_monthly_ticket_rows(races):
+    # races is indexed by (day, channel, race) with the day's amount and the race's purse
+    if races is None or races.empty:
+        return pd.DataFrame(columns=["date", *SALES_COLUMNS])
+    races = races.reset_index()
+    races["month"] = races["day"].dt.to_period("M")
+
+    live = races[races["channel"] == "live"].groupby("month").agg(
+        number_of_live_races=("race", "size"),
+        live_racing_revenue=("amount", "sum"),
+        purse_structure=("purse", lambda purse: purse.sum(min_count=1)),
+    )
+    simulcast = races[races["channel"] == "simulcast"].groupby("month").agg(
+        number_of_simulcast_days=("day", "nunique"),
+        simulcast_revenue=("amount", "sum"),
+    )
+
+    monthly = live.join(simulcast, how="outer").sort_index()
+    for column in ("number_of_live_races", "number_of_simulcast_days"):
+        monthly[column] = monthly[column].fillna(0).astype(int)
+    for column in ("live_racing_revenue", "simulcast_revenue"):
+        monthly[column] = monthly[column].fillna(0.0)
+    days = monthly["number_of_simulcast_days"].where(monthly["number_of_simulcast_days"] > 0)
+    monthly["simulcast_daily_averages"] = monthly["simulcast_revenue"] / days
+
+    monthly.insert(0, "date", monthly.index.strftime("%B %Y"))
+    return monthly[["date", *SALES_COLUMNS]].round(2).reset_index(drop=True)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def build_day_rows(day_rows):
+    # day_rows holds columns F-I of the live race days and of the simulcast weeks. A week
+    # is recorded on its week-ending date. Rows without sales yet (race days or weeks
+    # still to come) are skipped.
+    live_days, simulcast_weeks = day_rows
+    days = []
+    for date, races, sales, purse in live_days:
+        if is_number(sales):
+            days.append({
+                'date': date.strftime('%Y-%m-%d'),
+                'number_of_live_races': int(races) if is_number(races) else 0,
+                'live_racing_revenue': round(float(sales), 2),
+                'purse_structure': round(float(purse), 2) if is_number(purse) else 0.0,
+            })
+    for date, simulcast_days, sales, _ in simulcast_weeks:
+        if is_number(sales):
+            days.append({
+                'date': date.strftime('%Y-%m-%d'),
+                'number_of_simulcast_days': int(simulcast_days) if is_number(simulcast_days) else 0,
+                'simulcast_revenue': round(float(sales), 2),
+            })
+    return days
+
+def excel_to_csv_targets(excel_path, csv_path, reader=None):
     # Read the target Excel file
-    df_targets = pd.read_excel(excel_path)
-    
-    # Save to CSV
-    df_targets.to_csv(csv_path, index=False)
-    
-# If you want to run this script as a standalone script for testing
-if __name__ == "__main__":
+    df_targets = read_frame(excel_path, reader=reader)
+
+    # Save to CSV; the dashboard re-reads it as soon as its modification time changes
+    with atomic_write(csv_path) as tmp_path:
+        df_targets.to_csv(tmp_path, index=False)
+
+def get_workbook_precedence(month_sheets):
+    # Deterministic precedence when the same month appears in several workbooks: the
+    # workbook whose latest month sheet is most recent is the one still being maintained,
+    # so it wins; ties are broken by file name. month_sheets is {path: {sheet: date}}.
+    def sort_key(path):
+        latest = max(month_sheets[path].values(), default=pd.Timestamp.min)
+        return (-latest.value, os.path.basename(path))
+    return sorted(month_sheets, key=sort_key)
+
+def ingest_directory(input_dir, output_dir, workers=None, sales_csv_name='sales.csv', reader=None):
+    # Rebuild every output from a directory of workbooks, fanning sheets and workbooks out
+    # across a process pool. Workbooks with "targets" in their name are converted as-is to
+    # <name>.csv; all other workbooks are treated as monthly sales workbooks and their
+    # month sheets are consolidated into a single sales CSV.
+    workers = workers or os.cpu_count() or 1
+    workbook_paths = sorted(
+        os.path.join(input_dir, name)
+        for name in os.listdir(input_dir)
+        if name.endswith('.xlsx') and not name.startswith('~$')  # Skip Excel lock files
+    )
+    targets_paths = [path for path in workbook_paths if 'targets' in os.path.basename(path).lower()]
+    sales_paths = [path for path in workbook_paths if path not in targets_paths]
+
+    month_sheets = {}
+    for path in sales_paths:
+        sheet_dates = {sheet: parse_sheet_date(sheet) for sheet in get_sheet_fingerprints(path)}
+        month_sheets[path] = {sheet: sheet_date for sheet, sheet_date in sheet_dates.items() if sheet_date is not None}
+
+    # Pick one sheet per month, so duplicated months are only extracted once
+    chosen = {}
+    for path in get_workbook_precedence(month_sheets):
+        for sheet, sheet_date in month_sheets[path].items():
+            chosen.setdefault(sheet_date, (path, sheet))
+
+    sheets_by_workbook = {}
+    for path, sheet in chosen.values():
+        sheets_by_workbook.setdefault(path, []).append(sheet)
+
+    # Split each workbook into about one batch per worker; a batch opens its workbook once
+    batches = []
+    for path, sheets in sheets_by_workbook.items():
+        batch_size = math.ceil(len(sheets) / workers)
+        batches.extend((path, sheets[i:i + batch_size]) for i in range(0, len(sheets), batch_size))
+
+    os.makedirs(output_dir, exist_ok=True)
+    extracted = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        targets_futures = [
+            executor.submit(
+                excel_to_csv_targets,
+                path,
+                os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.csv'),
+                reader,
+            )
+            for path in targets_paths
+        ]
+        batch_futures = [executor.submit(extract_sales_rows, path, sheets, reader) for path, sheets in batches]
+
+        for (path, _), future in zip(batches, batch_futures):
+            for sheet, entry in future.result().items():
+                extracted[(path, sheet)] = entry
+        for future in targets_futures:
+            future.result()
+
+    entries = [extracted[chosen[sheet_date]] for sheet_date in sorted(chosen)]
+    consolidated_df = pd.DataFrame(
+        [entry["row"] for entry in entries if entry["row"] is not None], columns=["date", *SALES_COLUMNS]
+    )
+    write_sales_store(
+        consolidated_df, os.path.join(output_dir, sales_csv_name), [day for entry in entries for day in entry["days"]]
+    )
+
+    print(
+        f"Ingested {len(chosen)} month(s) from {len(sales_paths)} sales workbook(s) "
+        f"and {len(targets_paths)} targets workbook(s) using {workers} worker(s)"
+    )
+
+def benchmark_readers(excel_path, targets_excel_path=None, repeat=3):
+    # Time every installed reader backend on the same workbook: extracting all month sheets,
+    # plus reading a targets workbook when one is given. Reports the best of `repeat` runs.
+    month_sheets = [sheet for sheet in get_sheet_fingerprints(excel_path) if parse_sheet_date(sheet) is not None]
+    results = {}
+    for reader in available_readers():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            extract_sales_rows(excel_path, month_sheets, reader)
+            if targets_excel_path:
+                read_frame(targets_excel_path, reader=reader)
+            timings.append(time.perf_counter() - start)
+        results[reader] = min(timings)
+
+    fastest = min(results.values())
+    print(f"{len(month_sheets)} month sheet(s) in {excel_path}, best of {repeat} run(s):")
+    for reader, seconds in sorted(results.items(), key=lambda item: item[1]):
+        print(f"  {reader:<10} {seconds:8.3f}s  {seconds / fastest:5.1f}x")
+    return results
+
+def convert_default_workbooks():
     sales_excel_path = 'data/spreadsheets/sales.xlsx'
     sales_output_csv_path = 'data/csvs/sales.csv'
     consolidate_excel_sheets_to_csv(sales_excel_path, sales_output_csv_path)
-    
+
     targets_excel_path = 'data/spreadsheets/live-targets.xlsx'
     targets_output_csv_path = 'data/csvs/live-targets.csv'
     excel_to_csv_targets(targets_excel_path, targets_output_csv_path)
-    
+
     targets_excel_path = 'data/spreadsheets/simulcast-targets.xlsx'
     targets_output_csv_path = 'data/csvs/simulcast-targets.csv'
     excel_to_csv_targets(targets_excel_path, targets_output_csv_path)
+
+# If you want to run this script as a standalone script for testing
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the SVREL spreadsheets into the CSVs used by the dashboard")
+    subparsers = parser.add_subparsers(dest="command")
+
+    ingest_parser = subparsers.add_parser("ingest-dir", help="Rebuild all outputs from a directory of workbooks in parallel")
+    ingest_parser.add_argument("input_dir", nargs="?", default="data/spreadsheets")
+    ingest_parser.add_argument("--output-dir", default="data/csvs")
+    ingest_parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores)")
+    ingest_parser.add_argument("--reader", choices=available_readers(), default=None, help="Spreadsheet reader backend")
+
+    tickets_parser = subparsers.add_parser("ingest-tickets", help="Aggregate raw ticket exports into the monthly sales CSV")
+    tickets_parser.add_argument("export_paths", nargs="+", help="Ticket export CSV files, in any date order")
+    tickets_parser.add_argument("--output", default="data/csvs/sales.csv")
+    tickets_parser.add_argument("--chunksize", type=int, default=TICKET_CHUNK_SIZE, help="Tickets read per chunk")
+    tickets_parser.add_argument("--history-dir", default=None, help="Also append per-race figures to this daily history store")
+
+    benchmark_parser = subparsers.add_parser("benchmark-readers", help="Time each spreadsheet reader backend on the same workbook")
+    benchmark_parser.add_argument("excel_path", nargs="?", default="data/spreadsheets/sales.xlsx")
+    benchmark_parser.add_argument("--targets", default="data/spreadsheets/live-targets.xlsx", help="Targets workbook to include")
+    benchmark_parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "ingest-dir":
+        ingest_directory(args.input_dir, args.output_dir, workers=args.workers, reader=args.reader)
+    elif args.command == "ingest-tickets":
+        aggregate_ticket_exports(args.export_paths, args.output, chunksize=args.chunksize, history_dir=args.history_dir)
+    elif args.command == "benchmark-readers":
+        benchmark_readers(args.excel_path, args.targets, repeat=args.repeat)
+    else:
+        convert_default_workbooks()
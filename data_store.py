@@ -0,0 +1,542 @@
+import contextlib
+import datetime
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Directory holding sales.csv, its columnar store and the targets CSVs
+DATA_DIR = os.environ.get("SALES_DATA_DIR", "data/csvs")
+SALES_CSV_PATH = os.path.join(DATA_DIR, "sales.csv")
+TARGETS_DIR = DATA_DIR
+
+# Directory of the daily history store (see history_store.py)
+HISTORY_DIR = os.environ.get("HISTORY_DIR", os.path.join(DATA_DIR, "history"))
+
+# Where the dashboard reads sales data from: "columnar" (the .npy store, or sales.csv) or
+# "sqlite" (an indexed SQLite file next to sales.csv, queried per callback)
+STORAGE_ENGINE = os.environ.get("STORAGE_ENGINE", "columnar")
+
+# Venue recorded for the consolidated sales rows, until ingestion sees per-venue data
+DEFAULT_VENUE = "svrel"
+
+# How often (in seconds) workers check whether new sales data has been published
+DATA_RELOAD_INTERVAL = float(os.environ.get("DATA_RELOAD_INTERVAL", "5"))
+
+# Define the calendar order for months
+month_order = [
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+]
+
+# Metric columns of sales.csv and the dtype each one is stored with
+SALES_COLUMNS = {
+    "number_of_live_races": "i8",
+    "live_racing_revenue": "f8",
+    "purse_structure": "f8",
+    "number_of_simulcast_days": "i8",
+    "simulcast_revenue": "f8",
+    "simulcast_daily_averages": "f8",
+}
+
+# Metric columns of the daily rows in sales-daily.csv. Daily averages are not stored; they
+# are derived from revenue and days after resampling.
+DAILY_COLUMNS = {
+    column: SALES_COLUMNS[column]
+    for column in (
+        "number_of_live_races",
+        "live_racing_revenue",
+        "purse_structure",
+        "number_of_simulcast_days",
+        "simulcast_revenue",
+    )
+}
+
+# Layout of the columnar store: the metrics plus the derived date columns the dashboard
+# needs, so workers never have to re-parse dates or infer dtypes at startup
+COLUMNAR_DTYPE = np.dtype(
+    [("date", "M8[ns]"), ("year", "i4"), ("month_name", "U9"), ("month_index", "i1")]
+    + list(SALES_COLUMNS.items())
+)
+
+
+def get_columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".npy"
+
+
+# Layout version of the SQLite file, stored as its user_version. 2 added the daily rows.
+SALES_DATABASE_VERSION = 2
+
+
+def get_database_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".sqlite"
+
+
+def get_daily_csv_path(csv_path):
+    return os.path.splitext(csv_path)[0] + "-daily.csv"
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    # Yields a temporary path to write the new version of `path` to. Once the block
+    # completes it replaces `path` in one step, so readers (a running dashboard, the next
+    # ingestion run) only ever see the old file or the complete new one.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)  # Left behind by an interrupted run
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def add_derived_columns(df):
+    # Convert 'date' column to datetime to extract year and month
+    df["date"] = pd.to_datetime(df["date"], format="%B %Y")
+    df["year"] = df["date"].dt.year
+    df["month_name"] = df["date"].dt.strftime("%B")
+    df["month"] = pd.Categorical(df["month_name"], categories=month_order, ordered=True)
+    return df
+
+
+def write_sales_store(df, csv_path, days=()):
+    # Publish the consolidated sales data: the CSV, then a typed NumPy structured array
+    # and the daily rows (see write_daily_sales) next to it. The CSV goes first, so a store
+    # is never older than the CSV it was built from. An empty data set is written too, so
+    # a store from an earlier run never outlives it.
+    with atomic_write(csv_path) as tmp_path:
+        df.to_csv(tmp_path, index=False)
+    write_columnar_store(df, csv_path)
+    daily = write_daily_sales(days, csv_path)
+    if STORAGE_ENGINE == "sqlite":
+        write_sales_database(df, csv_path, daily)
+
+
+def write_columnar_store(df, csv_path):
+    if df.empty:
+        df = pd.DataFrame(columns=["date", *SALES_COLUMNS])
+    dates = pd.to_datetime(df["date"], format="%B %Y")
+    records = np.empty(len(df), dtype=COLUMNAR_DTYPE)
+    records["date"] = dates.to_numpy()
+    records["year"] = dates.dt.year.to_numpy()
+    records["month_name"] = dates.dt.strftime("%B").to_numpy()
+    records["month_index"] = dates.dt.month.to_numpy() - 1
+    for column in SALES_COLUMNS:
+        records[column] = df[column].to_numpy()
+
+    with atomic_write(get_columnar_path(csv_path)) as tmp_path, open(tmp_path, "wb") as f:
+        np.save(f, records)
+
+
+def write_sales_database(df, csv_path, daily=None, venue=DEFAULT_VENUE):
+    # Write the consolidated sales data and the daily rows (from write_daily_sales) to a
+    # SQLite file next to the CSV. Rows are keyed on (venue, year, month, day), with day 0
+    # for a whole-month total and the day of the month for a daily row, whose daily
+    # average is NULL. The table is clustered on that key (WITHOUT ROWID), which makes the
+    # primary key a covering index: a lookup by venue and a range of years or one month
+    # reads its rows straight from the index.
+    if df.empty:
+        df = pd.DataFrame(columns=["date", *SALES_COLUMNS])
+    if daily is None:
+        daily = pd.DataFrame(columns=list(DAILY_COLUMNS))
+    dates = pd.to_datetime(df["date"], format="%B %Y")
+    monthly_rows = zip(
+        [venue] * len(df),
+        dates.dt.year.tolist(),
+        dates.dt.month.tolist(),
+        [0] * len(df),
+        *(df[column].astype(object).where(df[column].notna(), None).tolist() for column in SALES_COLUMNS),
+    )
+    days = pd.DatetimeIndex(pd.to_datetime(daily.index, format="%Y-%m-%d"))
+    daily_rows = zip(
+        [venue] * len(daily),
+        days.year.tolist(),
+        days.month.tolist(),
+        days.day.tolist(),
+        *(daily[column].tolist() if column in DAILY_COLUMNS else [None] * len(daily) for column in SALES_COLUMNS),
+    )
+    column_types = {"i8": "INTEGER", "f8": "REAL"}
+
+    with atomic_write(get_database_path(csv_path)) as tmp_path:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute(
+                "CREATE TABLE sales (venue TEXT NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL, "
+                "day INTEGER NOT NULL, "
+                + "".join(f"{column} {column_types[dtype]}, " for column, dtype in SALES_COLUMNS.items())
+                + "PRIMARY KEY (venue, year, month, day)) WITHOUT ROWID"
+            )
+            conn.executemany(
+                f"INSERT INTO sales VALUES ({', '.join('?' * (4 + len(SALES_COLUMNS)))})",
+                itertools.chain(monthly_rows, daily_rows),
+            )
+            conn.execute(f"PRAGMA user_version = {SALES_DATABASE_VERSION}")
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def write_daily_sales(days, csv_path):
+    # Write daily rows (records with a YYYY-MM-DD date and some of DAILY_COLUMNS) next to
+    # the sales CSV, one row per date in date order. A live race day and a simulcast week
+    # ending on the same date share a row; missing metrics are 0. Returns the rows written,
+    # indexed by date.
+    daily = pd.DataFrame(days, columns=["date", *DAILY_COLUMNS])
+    daily = daily.fillna({column: 0 for column in DAILY_COLUMNS}).astype(DAILY_COLUMNS)
+    daily = daily.groupby("date", sort=True).sum().round(2)
+
+    with atomic_write(get_daily_csv_path(csv_path)) as tmp_path:
+        daily.to_csv(tmp_path)
+    return daily
+
+
+def read_sales_store(store_path):
+    # Memory-map the store read-only; only the pages that are touched get read from disk.
+    # copy=False keeps the numeric columns as views on the mapping, so they live in the
+    # page cache and every worker process that maps the same store shares one copy.
+    records = np.load(store_path, mmap_mode="r")
+    df = pd.DataFrame(
+        {column: records[column] for column in ("date", *SALES_COLUMNS, "year", "month_name")}, copy=False
+    )
+    df["month_name"] = df["month_name"].astype(object)
+    df["month"] = pd.Categorical.from_codes(records["month_index"], categories=month_order, ordered=True)
+    return df
+
+
+def is_older(path, csv_path):
+    # Whether path is missing or was written before csv_path was last published
+    return not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(csv_path)
+
+
+def load_sales_data(csv_path=SALES_CSV_PATH):
+    # Prefer the columnar store written by data_processing.py. A sales.csv published
+    # without a fresh store is read instead; only data_processing.py writes the store, so
+    # the dashboard never writes into the data directory.
+    store_path = get_columnar_path(csv_path)
+    if not is_older(store_path, csv_path):
+        try:
+            return read_sales_store(store_path)
+        except (OSError, ValueError) as e:
+            print(f"Could not read {store_path}, falling back to {csv_path}: {e}")
+    elif os.path.exists(store_path):
+        print(f"{store_path} is older than {csv_path}, reading {csv_path} instead")
+    return add_derived_columns(pd.read_csv(csv_path))
+
+
+def load_daily_sales(csv_path=SALES_CSV_PATH):
+    # Daily rows indexed by a sorted DatetimeIndex with one entry per date; empty when no
+    # daily data has been published
+    daily_path = get_daily_csv_path(csv_path)
+    if os.path.exists(daily_path):
+        daily = pd.read_csv(daily_path, dtype=DAILY_COLUMNS)
+    else:
+        daily = pd.DataFrame(columns=["date", *DAILY_COLUMNS]).astype(DAILY_COLUMNS)
+    daily.index = pd.DatetimeIndex(pd.to_datetime(daily.pop("date"), format="%Y-%m-%d"), name="date")
+    return daily.sort_index()
+
+
+def get_database_version(database_path):
+    # The SALES_DATABASE_VERSION a SQLite file was written with
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def load_sales(csv_path=SALES_CSV_PATH):
+    # The query interface over the sales data for the configured storage engine
+    if STORAGE_ENGINE == "sqlite":
+        database_path = get_database_path(csv_path)
+        if is_older(database_path, csv_path):
+            # Data published by an ingestion run that wasn't using the sqlite engine. Serve
+            # the CSVs until data_processing.py publishes the database.
+            print(f"{database_path} is missing or older than {csv_path}, reading {csv_path} instead")
+        elif get_database_version(database_path) != SALES_DATABASE_VERSION:
+            print(f"{database_path} was written by an older version, reading {csv_path} instead")
+        else:
+            return SalesDatabase(database_path)
+    return SalesFrame(load_sales_data(csv_path), load_daily_sales(csv_path))
+
+
+def empty_year_range():
+    # The year range of a data set without rows: the current year, so the dashboard still
+    # renders (with empty tables and graphs) until data is published
+    year = datetime.date.today().year
+    return year, year
+
+
+class SalesFrame:
+    # Sales queries over DataFrames held in memory. Every query returns rows in date order
+    # with the columns of load_sales_data, or of load_daily_sales for daily_rows.
+    def __init__(self, df, daily):
+        self.df = df
+        self.daily = daily
+
+    def year_range(self):
+        # (first year, last year) with data
+        if self.df.empty:
+            return empty_year_range()
+        return int(self.df["year"].min()), int(self.df["year"].max())
+
+    def rows(self, year, month_name):
+        # A month name that isn't in the calendar (e.g. a cleared dropdown) matches nothing
+        df = self.df
+        return df[(df["year"] == year) & (df["month_name"] == month_name)]
+
+    def rows_between(self, first_year, last_year):
+        df = self.df
+        return df[(df["year"] >= first_year) & (df["year"] <= last_year)]
+
+    def daily_rows(self, first_year, last_year):
+        return self.daily.loc[pd.Timestamp(first_year, 1, 1):pd.Timestamp(last_year, 12, 31)]
+
+
+class ThreadLocalConnection:
+    # One sqlite3 connection per thread, opened on first use with connect(). sqlite3
+    # connections must not be shared across threads or forked processes, so a fork gets
+    # new ones too.
+    def __init__(self, connect):
+        self.connect = connect
+        self.local = threading.local()
+
+    def get(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = self.connect()
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+
+class SalesDatabase:
+    # The same queries as SalesFrame, answered by parameterised lookups on the clustered
+    # (venue, year, month, day) key of the SQLite file written by write_sales_database.
+    # Nothing is held in memory beyond SQLite's page cache.
+    def __init__(self, path, venue=DEFAULT_VENUE):
+        self.path = path
+        self.venue = venue
+        # A connection keeps reading the file it opened even after a new version replaces it
+        self.connections = ThreadLocalConnection(lambda: sqlite3.connect(f"file:{self.path}?mode=ro", uri=True))
+
+    def connection(self):
+        return self.connections.get()
+
+    def query(self, where, params):
+        # Whole-month rows (day 0) matching where
+        columns = ", ".join(SALES_COLUMNS)
+        df = pd.read_sql_query(
+            f"SELECT year, month, {columns} FROM sales WHERE venue = ? AND {where} AND day = 0 ORDER BY year, month",
+            self.connection(),
+            params=(self.venue, *params),
+        )
+        dates = pd.to_datetime(pd.DataFrame({"year": df["year"], "month": df["month"], "day": 1}))
+        df.insert(0, "date", dates)
+        df["year"] = df.pop("year").astype("int32")
+        df["month_name"] = [month_order[month - 1] for month in df.pop("month")]
+        df["month"] = pd.Categorical(df["month_name"], categories=month_order, ordered=True)
+        return df
+
+    def year_range(self):
+        first_year, last_year = self.connection().execute(
+            "SELECT MIN(year), MAX(year) FROM sales WHERE venue = ? AND day = 0", (self.venue,)
+        ).fetchone()
+        if first_year is None:
+            return empty_year_range()
+        return first_year, last_year
+
+    def rows(self, year, month_name):
+        # Month 0 matches nothing, like a month name that isn't in the calendar
+        month = month_order.index(month_name) + 1 if month_name in month_order else 0
+        return self.query("year = ? AND month = ?", (int(year), month))
+
+    def rows_between(self, first_year, last_year):
+        return self.query("year BETWEEN ? AND ?", (int(first_year), int(last_year)))
+
+    def daily_rows(self, first_year, last_year):
+        # The daily rows (day > 0) of the years, read by a range scan of the primary key
+        columns = ", ".join(DAILY_COLUMNS)
+        df = pd.read_sql_query(
+            f"SELECT year, month, day, {columns} FROM sales "
+            "WHERE venue = ? AND year BETWEEN ? AND ? AND day > 0 ORDER BY year, month, day",
+            self.connection(),
+            params=(self.venue, int(first_year), int(last_year)),
+        )
+        dates = pd.to_datetime(pd.DataFrame({"year": df.pop("year"), "month": df.pop("month"), "day": df.pop("day")}))
+        df.index = pd.DatetimeIndex(dates, name="date")
+        return df.astype(DAILY_COLUMNS)
+
+
+def load_history(history_dir=HISTORY_DIR):
+    # The daily history store, or None when nothing has been written to history_dir
+    if not os.path.exists(os.path.join(history_dir, "meta.json")):
+        return None
+    from history_store import HistoryStore  # Imported here, since history_store imports this module
+
+    try:
+        return HistoryStore(history_dir)
+    except ValueError as e:
+        print(f"Not reading the history store: {e}")
+        return None
+
+
+def get_data_version(csv_path=SALES_CSV_PATH, history_dir=HISTORY_DIR):
+    # Identify a published data set by the size and mtime of the files load_sales reads,
+    # plus the history store's offsets, which grow with every appended day
+    parts = []
+    paths = (
+        get_columnar_path(csv_path),
+        get_database_path(csv_path),
+        get_daily_csv_path(csv_path),
+        csv_path,
+        os.path.join(history_dir, "offsets.bin"),
+    )
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        parts.append(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    return ":".join(parts)
+
+
+class DataSnapshot:
+    # One loaded version of the sales data plus everything derived from it. Snapshots are
+    # never modified after they are published, so a callback that grabbed one keeps a
+    # consistent view even if a newer version is swapped in while it runs.
+    def __init__(self, version, sales, history=None):
+        self.version = version
+        self.sales = sales  # A SalesFrame or SalesDatabase
+        self.history = history  # From load_history
+        # Days appended to the history store after this snapshot was loaded are not read
+        self.history_days = history.day_range() if history is not None else None
+        self.derived = {}
+        # Re-entrant, because building one derived value may derive another
+        self.lock = threading.RLock()
+
+    def derive(self, key, build):
+        # Cache build(sales) on this snapshot; a new data version starts with an empty cache
+        try:
+            return self.derived[key]
+        except KeyError:
+            pass
+        with self.lock:
+            if key not in self.derived:
+                self.derived[key] = build(self.sales)
+            return self.derived[key]
+
+    def daily_rows(self, first_year, last_year):
+        # Daily rows for the years from first_year to last_year, in the form of
+        # load_daily_sales. Days the history store holds are sliced from its memory-mapped
+        # files; the others come from the sales data's daily rows.
+        start, end = pd.Timestamp(first_year, 1, 1), pd.Timestamp(last_year, 12, 31)
+        daily = self.sales.daily_rows(first_year, last_year)
+        if self.history_days is None:
+            return daily
+        first_day, last_day = self.history_days
+        history = self.history.daily_totals(max(start, first_day), min(end, last_day), venue=DEFAULT_VENUE)
+        outside = daily[(daily.index < first_day) | (daily.index > last_day)]
+        if outside.empty:
+            return history
+        return pd.concat([outside, history]).sort_index()
+
+
+class SnapshotManager:
+    # Serves the current DataSnapshot and hot-reloads the sales data when a new version is
+    # published, without restarting the worker. The version check is a couple of stat()
+    # calls at most every `interval` seconds; loading happens on a background thread and
+    # the new snapshot replaces the old one in a single assignment. A load that finishes
+    # after a newer version was published is dropped, so an older snapshot never replaces
+    # a newer one.
+    def __init__(self, csv_path=SALES_CSV_PATH, interval=DATA_RELOAD_INTERVAL, history_dir=HISTORY_DIR):
+        self.csv_path = csv_path
+        self.interval = interval
+        self.history_dir = history_dir
+        version = get_data_version(csv_path, history_dir)
+        self.snapshot = self.load_snapshot(version)
+        self.pending_version = version
+        self.next_check = time.monotonic() + interval
+        self.lock = threading.Lock()
+
+    def current(self):
+        if time.monotonic() >= self.next_check:
+            self.check_for_update()
+        return self.snapshot
+
+    def check_for_update(self):
+        with self.lock:
+            self.next_check = time.monotonic() + self.interval
+            version = get_data_version(self.csv_path, self.history_dir)
+            if version == self.pending_version:
+                return  # Already loaded, or being loaded right now
+            self.pending_version = version
+        threading.Thread(target=self.load, args=(version,), daemon=True).start()
+
+    def load(self, version):
+        try:
+            snapshot = self.load_snapshot(version)
+        except Exception as e:
+            # Keep serving the previous snapshot; the next publish triggers a new attempt
+            print(f"Could not reload sales data version {version}: {e}")
+            return
+        with self.lock:
+            if version != self.pending_version:
+                print(f"Discarded sales data version {version}, superseded by {self.pending_version}")
+                return
+            self.snapshot = snapshot
+        print(f"Loaded sales data version {version}")
+
+    def load_snapshot(self, version):
+        return DataSnapshot(version, load_sales(self.csv_path), load_history(self.history_dir))
+
+
+class TargetsIndex:
+    # Monthly targets keyed by (target kind, year, month name), e.g.
+    # ("live-targets", 2024, "January"). Each targets CSV is parsed once and re-read only
+    # when its modification time changes, so a lookup is a stat() plus a dict access.
+    def __init__(self, directory=TARGETS_DIR):
+        self.directory = directory
+        self.targets = {}
+        self.mtimes = {}
+        self.lock = threading.Lock()
+
+    def get(self, kind, year, month_name, default=0):
+        self.refresh(kind)
+        return self.targets[kind].get((int(year), month_name), default)
+
+    def version(self, kind):
+        # Changes whenever the targets file for `kind` is republished
+        self.refresh(kind)
+        return self.mtimes[kind]
+
+    def refresh(self, kind):
+        path = os.path.join(self.directory, kind + ".csv")
+        mtime = os.stat(path).st_mtime_ns
+        if self.mtimes.get(kind) == mtime:
+            return
+        with self.lock:
+            if self.mtimes.get(kind) == mtime:
+                return  # Another thread reloaded it while we waited
+            df_targets = pd.read_csv(path)
+            months = pd.to_datetime(df_targets["Month"])
+            index = {}
+            for key, target in zip(zip(months.dt.year, months.dt.strftime("%B")), df_targets["Target"].to_numpy()):
+                index.setdefault(key, target)  # Keep the first row, as the old lookup did
+            self.targets[kind] = index
+            self.mtimes[kind] = mtime
@@ -0,0 +1,24 @@
+# gunicorn settings for the dashboard (see startup.txt)
+import gc
+
+bind = "0.0.0.0"
+timeout = 600
+
+# Import app.py once in the master, before forking the workers. The sales data snapshot,
+# the targets and the outputs derived at import are then shared copy-on-write by every
+# worker instead of each worker loading its own copy.
+preload_app = True
+
+# Copy-on-write sharing only lasts while nothing writes to the shared pages. The cyclic
+# garbage collector writes to every tracked object it visits, so keep it off while the
+# master imports the app, move everything it created to the permanent generation just
+# before each fork, and only re-enable collection inside the worker.
+gc.disable()
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from data_store import DAILY_COLUMNS, DEFAULT_VENUE, HISTORY_DIR, atomic_write
+
+# Metrics kept for every (day, venue, race) row. Race 0 holds figures that are not tied
+# to a race, such as a day's simulcast sales.
+HISTORY_COLUMNS = {
+    "live_racing_revenue": "f8",
+    "purse_structure": "f8",
+    "simulcast_revenue": "f8",
+}
+
+# Key columns stored alongside the metrics; venue is a code into the venues sidecar
+KEY_COLUMNS = {"venue": "i2", "race": "i2"}
+
+# Bump this whenever the file layout changes; a store in another layout is not opened
+HISTORY_VERSION = 1
+
+
+class HistoryStore:
+    # Append-only daily history. Every column is a flat file of fixed-width little-endian
+    # values, one per row, memory-mapped for reading, so a date range is a slice of each
+    # file and only the pages it touches are read. Rows are stored in day order, and
+    # offsets.bin holds the first row of every day since the first one, plus the total
+    # row count, so finding a range costs two array lookups.
+    #
+    # Appending a day only appends to the column files and then to offsets.bin. The
+    # offsets are the commit record: readers never look past offsets[-1], and a writer
+    # interrupted mid-append leaves a tail that the next append truncates. There must be
+    # a single writer at a time; any number of processes can read.
+    def __init__(self, directory=HISTORY_DIR, columns=HISTORY_COLUMNS):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.offsets_path = os.path.join(directory, "offsets.bin")
+        self.venues_path = os.path.join(directory, "venues.json")
+        self.lock = threading.Lock()
+        self.maps = None
+        self.maps_size = None
+
+        if not os.path.exists(self.meta_path):
+            os.makedirs(directory, exist_ok=True)
+            self.meta = {"version": HISTORY_VERSION, "first_day": None, "columns": dict(columns)}
+            write_json(self.venues_path, [])
+            with open(self.offsets_path, "wb") as f:
+                f.write(np.zeros(1, dtype="<i8").tobytes())
+            write_json(self.meta_path, self.meta)
+        with open(self.meta_path) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != HISTORY_VERSION:
+            raise ValueError(f"{directory} holds history store version {self.meta.get('version')}, not {HISTORY_VERSION}")
+        self.columns = {**KEY_COLUMNS, **self.meta["columns"]}
+
+    def column_path(self, column):
+        return os.path.join(self.directory, column + ".bin")
+
+    @property
+    def first_day(self):
+        first_day = self.meta["first_day"]
+        return None if first_day is None else pd.Timestamp(first_day)
+
+    def venues(self):
+        with open(self.venues_path) as f:
+            return json.load(f)
+
+    def mapped(self):
+        # (offsets, {column: array}) as of the last committed append. The maps are reused
+        # until offsets.bin grows, so reading is a stat() when nothing was appended.
+        size = os.stat(self.offsets_path).st_size
+        if size != self.maps_size:
+            with self.lock:
+                if size != self.maps_size:
+                    if self.meta["first_day"] is None:
+                        # Another process may have made the first append since we opened
+                        with open(self.meta_path) as f:
+                            self.meta = json.load(f)
+                    offsets = np.memmap(self.offsets_path, dtype="<i8", mode="r", shape=(size // 8,))
+                    rows = int(offsets[-1])
+                    arrays = {}
+                    for column, dtype in self.columns.items():
+                        if rows:
+                            arrays[column] = np.memmap(self.column_path(column), dtype="<" + dtype, mode="r", shape=(rows,))
+                        else:
+                            arrays[column] = np.empty(0, dtype="<" + dtype)
+                    self.maps = offsets, arrays
+                    self.maps_size = size
+        return self.maps
+
+    def day_range(self):
+        # (first day, last day) with data, or None for an empty store
+        offsets, _ = self.mapped()
+        if len(offsets) < 2:
+            return None
+        return self.first_day, self.first_day + pd.Timedelta(days=len(offsets) - 2)
+
+    def append_day(self, day, rows):
+        # Append one day's rows, given as a DataFrame with venue, race and the metric
+        # columns. Missing metrics are stored as NaN (0 for integer columns) and a missing
+        # venue as DEFAULT_VENUE. The day must come after every day already in the store;
+        # earlier data is never rewritten.
+        day = pd.Timestamp(day).normalize()
+        if self.first_day is None:
+            self.meta["first_day"] = day.strftime("%Y-%m-%d")
+            write_json(self.meta_path, self.meta)
+
+        offsets, _ = self.mapped()
+        day_index = (day - self.first_day).days
+        days_stored = len(offsets) - 1
+        if day_index < days_stored:
+            last_day = self.first_day + pd.Timedelta(days=days_stored - 1)
+            raise ValueError(f"Cannot append {day:%Y-%m-%d}: the history already runs to {last_day:%Y-%m-%d}")
+
+        total = int(offsets[-1])
+        venue_codes = self.venue_codes(rows["venue"] if "venue" in rows else [DEFAULT_VENUE] * len(rows))
+        for column, dtype in self.columns.items():
+            if column == "venue":
+                values = venue_codes
+            elif column in rows:
+                values = rows[column].to_numpy()
+            else:
+                values = np.full(len(rows), np.nan if dtype.startswith("f") else 0)
+            with open(self.column_path(column), "ab") as f:
+                f.truncate(total * np.dtype(dtype).itemsize)  # Drop any uncommitted tail
+                f.write(np.asarray(values, dtype="<" + dtype).tobytes())
+
+        # Days skipped since the last append are stored as empty days
+        new_offsets = np.full(day_index - days_stored + 1, total, dtype="<i8")
+        new_offsets[-1] = total + len(rows)
+        with open(self.offsets_path, "ab") as f:
+            f.write(new_offsets.tobytes())
+
+    def venue_codes(self, venues):
+        # Codes of each venue name, adding unseen venues to the sidecar
+        names = self.venues()
+        codes = {name: code for code, name in enumerate(names)}
+        new_names = [name for name in dict.fromkeys(venues) if name not in codes]
+        if new_names:
+            for name in new_names:
+                codes[name] = len(names)
+                names.append(name)
+            write_json(self.venues_path, names)
+        return np.array([codes[name] for name in venues], dtype="i2")
+
+    def slice(self, start=None, end=None, columns=None, venue=None):
+        # Rows for the days from start to end inclusive (either may be None for an open
+        # end), with date, venue, race and the requested metric columns. Metrics are views
+        # on the mapped files unless a venue filter forces a copy.
+        offsets, arrays = self.mapped()
+        columns = list(self.meta["columns"] if columns is None else columns)
+        days_stored = len(offsets) - 1
+        first_index = 0 if start is None or self.first_day is None else (pd.Timestamp(start) - self.first_day).days
+        last_index = days_stored - 1 if end is None or self.first_day is None else (pd.Timestamp(end) - self.first_day).days
+        first_index = min(max(first_index, 0), days_stored)
+        last_index = min(max(last_index, first_index - 1), days_stored - 1)
+
+        begin, stop = int(offsets[first_index]), int(offsets[last_index + 1])
+        day_indexes = np.repeat(
+            np.arange(first_index, last_index + 1), np.diff(offsets[first_index:last_index + 2])
+        )
+        first_day = self.first_day if self.first_day is not None else pd.Timestamp(0)
+        df = pd.DataFrame(
+            {
+                "date": first_day.to_datetime64() + day_indexes.astype("timedelta64[D]"),
+                "venue": pd.Categorical.from_codes(arrays["venue"][begin:stop], categories=self.venues() or [""]),
+                "race": arrays["race"][begin:stop],
+                **{column: arrays[column][begin:stop] for column in columns},
+            },
+            copy=False,
+        )
+        if venue is not None:
+            df = df[df["venue"] == venue].reset_index(drop=True)
+        return df
+
+    def daily_totals(self, start=None, end=None, venue=None):
+        # The DAILY_COLUMNS of sales-daily.csv for every day from start to end that has
+        # rows, indexed by date: the number of live races (rows with race > 0), the summed
+        # metrics, and one simulcast day for a day with simulcast sales
+        rows = self.slice(start, end, columns=["live_racing_revenue", "purse_structure", "simulcast_revenue"], venue=venue)
+        rows["number_of_live_races"] = rows["race"] > 0
+        daily = rows.groupby("date")[
+            ["number_of_live_races", "live_racing_revenue", "purse_structure", "simulcast_revenue"]
+        ].sum()
+        daily["number_of_simulcast_days"] = daily["simulcast_revenue"] > 0
+        daily.index = pd.DatetimeIndex(daily.index.astype("M8[ns]"), name="date")
+        return daily[list(DAILY_COLUMNS)].astype(DAILY_COLUMNS).round(2)
+
+
+def write_json(path, value):
+    with atomic_write(path) as tmp_path, open(tmp_path, "w") as f:
+        json.dump(value, f)
@@ -0,0 +1,297 @@
+import bisect
+import cProfile
+import datetime
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+from data_store import atomic_write
+
+try:
+    import psutil
+except ImportError:  # Only needed for the per-worker memory metrics
+    psutil = None
+
+# When set, every worker also dumps its metrics into this directory and /metrics reports
+# all live workers, whichever one happens to serve the scrape
+METRICS_DIR = os.environ.get("METRICS_DIR")
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+CALLBACK_PATH = "/_dash-update-component"
+
+# Callbacks to profile on every request: "all" or a comma separated list of callback
+# function names, e.g. PROFILE_CALLBACKS=update_month_outputs,update_graph. Unset = off.
+PROFILE_CALLBACKS = os.environ.get("PROFILE_CALLBACKS", "")
+# Where the .prof files go: a directory only the app's user can write to, like the
+# callback cache. Setting PROFILE_DIR or PROFILE_TOKEN also allows profiling a single
+# request on demand with ?profile=<token> or an "X-Profile-Callback: <token>" header on
+# /_dash-update-component. Without a token, only requests from localhost may ask, with 1
+# in place of the token; behind a reverse proxy on the same host every request comes from
+# localhost, so set a token there.
+PROFILE_DIR = os.environ.get("PROFILE_DIR")
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "profiles")
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_HEADER = "X-Profile-Callback"
+# Only the newest PROFILE_MAX_FILES .prof files are kept
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+LOCALHOST_ADDRESSES = ("127.0.0.1", "::1")
+
+
+class CallbackMetrics:
+    # Per-callback latency and payload size histograms plus callback cache hit/miss
+    # counters, exposed in the Prometheus text format at /metrics on the Flask server.
+    # Every series carries a worker label (the process id) so gunicorn workers can be
+    # told apart.
+    def __init__(self, metrics_dir=METRICS_DIR, dump_interval=1.0):
+        self.metrics_dir = metrics_dir
+        self.dump_interval = dump_interval
+        self.lock = threading.Lock()
+        self.dump_lock = threading.Lock()
+        self.histograms = {"duration": {}, "payload": {}}
+        self.cache_lookups = {}
+        self.callback_names = {}
+        self.next_dump = 0
+        self.dash_app = None
+
+    def init_app(self, dash_app):
+        self.dash_app = dash_app
+        server = dash_app.server
+        server.before_request(self.before_request)
+        server.after_request(self.after_request)
+        server.add_url_rule("/metrics", "metrics", self.metrics_view)
+
+    def callback_name(self, output):
+        name = self.callback_names.get(output)
+        if name is None:
+            name = callback_name(self.dash_app, output)
+            self.callback_names[output] = name
+        return name
+
+    def before_request(self):
+        if request.path.endswith(CALLBACK_PATH):
+            g.callback_started = time.perf_counter()
+
+    def after_request(self, response):
+        started = g.pop("callback_started", None)
+        if started is not None:
+            body = request.get_json(silent=True) or {}
+            payload_size = response.content_length
+            if payload_size is None:
+                payload_size = len(response.get_data())
+            self.record_callback(self.callback_name(body.get("output", "unknown")), time.perf_counter() - started, payload_size)
+        return response
+
+    def observe(self, histogram, callback, buckets, value):
+        # Each histogram entry is [count per bucket..., sum, count]
+        entry = self.histograms[histogram].setdefault(callback, [0] * (len(buckets) + 2))
+        index = bisect.bisect_left(buckets, value)
+        if index < len(buckets):
+            entry[index] += 1  # Values above the largest bucket only count towards +Inf
+        entry[-2] += value
+        entry[-1] += 1
+
+    def record_callback(self, callback, duration, payload_size):
+        with self.lock:
+            self.observe("duration", callback, DURATION_BUCKETS, duration)
+            self.observe("payload", callback, PAYLOAD_BUCKETS, payload_size)
+        self.maybe_dump()
+
+    def record_cache_lookup(self, callback, hit):
+        with self.lock:
+            counts = self.cache_lookups.setdefault(callback, {"hit": 0, "miss": 0})
+            counts["hit" if hit else "miss"] += 1
+        self.maybe_dump()
+
+    def state(self):
+        with self.lock:
+            return json.loads(json.dumps({"histograms": self.histograms, "cache_lookups": self.cache_lookups}))
+
+    def maybe_dump(self):
+        # One thread per worker dumps at a time; the others skip rather than wait on the
+        # write. A failed dump is reported and never fails the request that triggered it.
+        if not self.metrics_dir or not self.dump_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() < self.next_dump:
+                return
+            self.next_dump = time.monotonic() + self.dump_interval
+            path = os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+            try:
+                os.makedirs(self.metrics_dir, exist_ok=True)
+                with atomic_write(path) as tmp_path, open(tmp_path, "w") as f:
+                    json.dump(self.state(), f)
+            except OSError as e:
+                print(f"Could not dump callback metrics to {path}: {e}")
+        finally:
+            self.dump_lock.release()
+
+    def worker_states(self):
+        # {worker pid: state}; this worker is always reported from memory
+        states = {}
+        if self.metrics_dir:
+            for path in glob.glob(os.path.join(self.metrics_dir, "*.json")):
+                pid = int(os.path.splitext(os.path.basename(path))[0])
+                if not pid_alive(pid):
+                    continue  # Worker exited or was recycled by gunicorn
+                try:
+                    with open(path) as f:
+                        states[pid] = json.load(f)
+                except (OSError, ValueError):
+                    continue
+        states[os.getpid()] = self.state()
+        return states
+
+    def render(self):
+        lines = []
+        states = self.worker_states()
+
+        histograms = (
+            ("duration", "dash_callback_duration_seconds", "Time spent serving a Dash callback request", DURATION_BUCKETS),
+            ("payload", "dash_callback_response_bytes", "Size of the Dash callback response body", PAYLOAD_BUCKETS),
+        )
+        for key, metric, help_text, buckets in histograms:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for pid, state in sorted(states.items()):
+                for callback, entry in sorted(state["histograms"][key].items()):
+                    labels = f'callback="{callback}",worker="{pid}"'
+                    cumulative = 0
+                    for bound, count in zip(buckets, entry):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {entry[-1]}')
+                    lines.append(f"{metric}_sum{{{labels}}} {entry[-2]}")
+                    lines.append(f"{metric}_count{{{labels}}} {entry[-1]}")
+
+        lines.append("# HELP dash_callback_cache_requests_total Callback cache lookups by result")
+        lines.append("# TYPE dash_callback_cache_requests_total counter")
+        for pid, state in sorted(states.items()):
+            for callback, counts in sorted(state["cache_lookups"].items()):
+                for result in ("hit", "miss"):
+                    lines.append(
+                        f'dash_callback_cache_requests_total{{callback="{callback}",worker="{pid}",result="{result}"}} {counts[result]}'
+                    )
+        if psutil is not None:
+            lines.append("# HELP dash_worker_memory_bytes Resident (rss), proportional (pss) and private (uss) worker memory")
+            lines.append("# TYPE dash_worker_memory_bytes gauge")
+            for pid in sorted(states):
+                memory = worker_memory(pid)
+                for kind in ("rss", "pss", "uss"):
+                    if kind in memory:
+                        lines.append(f'dash_worker_memory_bytes{{worker="{pid}",kind="{kind}"}} {memory[kind]}')
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+
+class CallbackProfiler:
+    # Runs cProfile around single Dash callback requests and writes the stats to
+    # <profile_dir>/<callback>-<timestamp>-<pid>.prof, for snakeviz or pstats. Requests are
+    # profiled when their callback is listed in `callbacks`, or on demand when an
+    # authorized request asks for it. Only the newest max_files profiles are kept. With
+    # nothing configured the hooks return straight away.
+    #
+    # To profile one slow interaction on a running server, copy the callback request from
+    # the browser's network tab as curl and replay it with ?profile=<token> appended.
+    def __init__(self, callbacks=PROFILE_CALLBACKS, profile_dir=PROFILE_DIR, token=PROFILE_TOKEN, max_files=PROFILE_MAX_FILES):
+        self.callbacks = {name.strip() for name in callbacks.split(",") if name.strip()}
+        self.on_demand = bool(profile_dir or token)
+        self.profile_dir = profile_dir or DEFAULT_PROFILE_DIR
+        self.token = token
+        self.max_files = max_files
+        self.dash_app = None
+
+    def init_app(self, dash_app):
+        self.dash_app = dash_app
+        if not self.callbacks and not self.on_demand:
+            return  # Profiling off: no per-request hooks at all
+        dash_app.server.before_request(self.before_request)
+        dash_app.server.after_request(self.after_request)
+
+    def wants_profile(self, name):
+        if "all" in self.callbacks or name in self.callbacks:
+            return True
+        if not self.on_demand:
+            return False
+        asked = request.args.get("profile") or request.headers.get(PROFILE_HEADER)
+        if not asked:
+            return False
+        if self.token:
+            return hmac.compare_digest(asked.encode(), self.token.encode())
+        return asked == "1" and request.remote_addr in LOCALHOST_ADDRESSES
+
+    def before_request(self):
+        if not request.path.endswith(CALLBACK_PATH):
+            return
+        body = request.get_json(silent=True) or {}
+        name = callback_name(self.dash_app, body.get("output", "unknown"))
+        if not self.wants_profile(name):
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return  # Another profiler is already active in this process
+        g.callback_profile = (name, profiler)
+
+    def after_request(self, response):
+        profile = g.pop("callback_profile", None)
+        if profile is None:
+            return response
+        name, profiler = profile
+        profiler.disable()
+        timestamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S.%f")
+        path = os.path.join(self.profile_dir, f"{name}-{timestamp}-{os.getpid()}.prof")
+        try:
+            os.makedirs(self.profile_dir, mode=0o700, exist_ok=True)
+            profiler.dump_stats(path)
+            self.prune()
+        except OSError as e:
+            print(f"Could not write callback profile {path}: {e}")
+        return response
+
+    def prune(self):
+        # Remove all but the newest max_files profiles, oldest first
+        paths = sorted(glob.glob(os.path.join(self.profile_dir, "*.prof")), key=os.path.getmtime)
+        for path in paths[:max(len(paths) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Pruned by another worker
+
+
+def callback_name(dash_app, output):
+    # Name a callback after its Python function rather than its (long) output id
+    callback = dash_app.callback_map.get(output, {}).get("callback") if dash_app else None
+    return getattr(callback, "__name__", output)
+
+
+def worker_memory(pid):
+    # {"rss": bytes, "pss": bytes, "uss": bytes}; pss and uss need /proc/<pid>/smaps (Linux)
+    try:
+        process = psutil.Process(pid)
+        try:
+            info = process.memory_full_info()
+        except psutil.AccessDenied:
+            info = process.memory_info()
+    except psutil.NoSuchProcess:
+        return {}
+    return {kind: getattr(info, kind) for kind in ("rss", "pss", "uss") if hasattr(info, kind)}
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, but owned by someone else
+    return True
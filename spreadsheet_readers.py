@@ -0,0 +1,122 @@
+import datetime
+import os
+from itertools import islice
+
+import openpyxl
+import pandas as pd
+
+try:
+    import python_calamine
+except ImportError:  # The native reader is optional
+    python_calamine = None
+
+# Backend used when none is requested explicitly; can be overridden per deployment
+DEFAULT_READER = os.environ.get("SPREADSHEET_READER", "openpyxl")
+
+
+class OpenpyxlReader:
+    # Pure-openpyxl, read-only streaming reader. Rows are parsed lazily, so a caller that
+    # stops iterating early never pays for the rest of the sheet.
+    name = "openpyxl"
+
+    def __init__(self, excel_path):
+        self.workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+        self.sheet_names = self.workbook.sheetnames
+
+    def iter_rows(self, sheet, min_row=1, min_col=1, max_col=None):
+        # Yields tuples of cell values; row and column numbers are 1-based like in Excel
+        return self.workbook[sheet].iter_rows(min_row=min_row, min_col=min_col, max_col=max_col, values_only=True)
+
+    def close(self):
+        self.workbook.close()
+
+
+class CalamineReader:
+    # Native Rust parser (python-calamine), several times faster than openpyxl. Only
+    # available when the python-calamine package is installed.
+    name = "calamine"
+
+    def __init__(self, excel_path):
+        self.workbook = python_calamine.CalamineWorkbook.from_path(excel_path)
+        self.sheet_names = self.workbook.sheet_names
+
+    def iter_rows(self, sheet, min_row=1, min_col=1, max_col=None):
+        worksheet = self.workbook.get_sheet_by_name(sheet)
+        # Keep leading empty rows/columns so positions match the other backends
+        rows = worksheet.to_python(skip_empty_area=False)
+        for row in islice(rows, min_row - 1, None):
+            # Calamine may return short rows
+            values = [self.convert_cell(value) for value in row[min_col - 1:max_col]]
+            if max_col is not None:
+                values.extend([None] * (max_col - min_col + 1 - len(values)))
+            yield tuple(values)
+
+    @staticmethod
+    def convert_cell(value):
+        # Match openpyxl's cell values: calamine reports empty cells as "", every number as
+        # a float and date-only cells as datetime.date
+        if value == "":
+            return None
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if type(value) is datetime.date:
+            return datetime.datetime(value.year, value.month, value.day)
+        return value
+
+    def close(self):
+        self.workbook.close()
+
+
+class PandasReader:
+    # The original pd.read_excel path: every sheet is loaded into a DataFrame in full
+    name = "pandas"
+
+    def __init__(self, excel_path):
+        self.xls = pd.ExcelFile(excel_path)
+        self.sheet_names = self.xls.sheet_names
+
+    def iter_rows(self, sheet, min_row=1, min_col=1, max_col=None):
+        df = self.xls.parse(sheet, header=None)
+        df = df.astype(object).where(df.notna(), None)
+        return df.iloc[min_row - 1:, min_col - 1:max_col].itertuples(index=False, name=None)
+
+    def close(self):
+        self.xls.close()
+
+
+READERS = {reader.name: reader for reader in (OpenpyxlReader, CalamineReader, PandasReader)}
+
+
+def available_readers():
+    return [name for name in READERS if name != "calamine" or python_calamine is not None]
+
+
+class open_workbook:
+    # Context manager returning a reader for excel_path, e.g.
+    #     with open_workbook(path, "calamine") as workbook:
+    #         rows = workbook.iter_rows(workbook.sheet_names[0])
+    def __init__(self, excel_path, reader=None):
+        reader = reader or DEFAULT_READER
+        if reader not in available_readers():
+            raise ValueError(f"Spreadsheet reader '{reader}' is not available, choose from {available_readers()}")
+        self.reader = READERS[reader](excel_path)
+
+    def __enter__(self):
+        return self.reader
+
+    def __exit__(self, *exc_info):
+        self.reader.close()
+
+
+def read_frame(excel_path, sheet=None, reader=None):
+    # Read a whole sheet (the first one by default) into a DataFrame, using its first row
+    # as the header, the same way pd.read_excel does
+    with open_workbook(excel_path, reader) as workbook:
+        rows = list(workbook.iter_rows(sheet or workbook.sheet_names[0]))
+    if not rows:
+        return pd.DataFrame()
+    df = pd.DataFrame(rows[1:], columns=rows[0])
+    # Drop trailing rows that are completely empty, which pandas also ignores
+    non_empty = df.notna().any(axis=1).to_numpy().nonzero()[0]
+    df = df.iloc[: non_empty[-1] + 1] if len(non_empty) else df.iloc[:0]
+    return df.infer_objects()
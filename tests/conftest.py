@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Run the app against the repo's sample data, without the shared callback cache
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SALES_DATA_DIR", os.path.join(ROOT, "data", "csvs"))
+os.environ.setdefault("CALLBACK_CACHE_SIZE", "0")
@@ -0,0 +1,110 @@
+import json
+
+import plotly.graph_objs as go
+import pytest
+from plotly.utils import PlotlyJSONEncoder
+
+import app
+from analytics import FREQUENCIES
+from data_store import SALES_COLUMNS, month_order
+
+
+def serialise(figure):
+    # The JSON Dash sends for a figure, parsed back so key order doesn't matter
+    return json.loads(json.dumps(figure, cls=PlotlyJSONEncoder))
+
+
+def graph_objs_gauge(title, colors, selected_month, selected_year, total_sales, sales_target):
+    # The gauge as it was built with go.Figure/go.Indicator before the figures became dicts
+    total_sales = total_sales / 1e6
+    sales_target = sales_target / 1e6
+    max_range = max(sales_target, total_sales)
+    figure = go.Figure(
+        go.Indicator(
+            mode="gauge+number",
+            value=total_sales,
+            number={"suffix": "M"},
+            domain={"x": [0, 1], "y": [0, 1]},
+            title={"text": f"{title} for {selected_month} {selected_year} (Millions)"},
+            gauge={
+                "axis": {"range": [0, max_range]},
+                "bar": {"color": colors["bar"]},
+                "steps": [
+                    {"range": [0, sales_target], "color": colors["step"]},
+                    {"range": [sales_target, max_range], "color": app.excess_step_color},
+                ],
+                "threshold": {
+                    "line": {"color": "red", "width": 4},
+                    "thickness": 0.75,
+                    "value": sales_target,
+                },
+            },
+        )
+    )
+    figure.add_annotation(
+        x=0.5,
+        y=0.3,
+        text=f"Target: {sales_target:.2f}M",
+        showarrow=False,
+        font=dict(size=16, color="#475569"),
+    )
+    return figure
+
+
+# None is a cleared month dropdown, for which both gauges show 0
+@pytest.mark.parametrize("selected_month", [*month_order, None])
+def test_revenue_gauges_match_graph_objs(selected_month):
+    snapshot = app.data_snapshots.current()
+    years = app.get_year_range(None, snapshot)
+    selected_year = years[1]
+    month_data = snapshot.sales.rows(selected_year, selected_month)
+    _, _, live_gauge, simulcast_gauge = app.build_month_outputs(selected_month, years, snapshot)
+
+    gauges = [
+        (live_gauge, "Live Racing Revenue", app.live_racing_gauge_colors, "live_racing_revenue", "live-targets"),
+        (simulcast_gauge, "Simulcast Revenue", app.simulcast_gauge_colors, "simulcast_revenue", "simulcast-targets"),
+    ]
+    for gauge, title, colors, column, target_file in gauges:
+        expected = graph_objs_gauge(
+            title,
+            colors,
+            selected_month,
+            selected_year,
+            month_data[column].sum(),
+            app.get_sales_target(target_file, selected_month, selected_year),
+        )
+        assert serialise(gauge) == serialise(expected)
+
+
+@pytest.mark.parametrize("frequency", FREQUENCIES)
+@pytest.mark.parametrize("selected_metric", SALES_COLUMNS)
+def test_comparison_graph_matches_graph_objs(selected_metric, frequency):
+    snapshot = app.data_snapshots.current()
+    first_year, last_year = app.get_year_range(None, snapshot)
+    series = app.get_kpi_series(selected_metric, frequency, (first_year, last_year), snapshot)
+    title, graph_title = app.comparison_graph_title(selected_metric, first_year, last_year)
+
+    traces = []
+    for year, name, color, dash in app.year_trace_styles(first_year, last_year):
+        values = app.downsample_series(series[year], app.KPI_GRAPH_MAX_POINTS)
+        traces.append(
+            go.Scatter(
+                x=values.index.strftime("%Y-%m-%d").tolist(),
+                y=values.to_numpy(),
+                mode="lines+markers",
+                name=name,
+                marker_color=color,
+                line=dict(dash=dash),
+            )
+        )
+    expected = {
+        "data": traces,
+        "layout": go.Layout(
+            title=graph_title,
+            xaxis={"title": FREQUENCIES[frequency], "type": "date", **app.kpi_axis_formats[frequency]},
+            yaxis={"title": title},
+        ),
+    }
+
+    figure = app.build_comparison_graph(selected_metric, frequency, (first_year, last_year), snapshot)
+    assert serialise(figure) == serialise(expected)